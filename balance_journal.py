@@ -0,0 +1,376 @@
+"""Append-only journal of balance events with snapshots and compaction.
+
+Every change to the balance is appended as one JSON line to the journal
+(`finance_balance.journal` next to `finance_balance.json`). Each event
+carries the balance after it, so the current balance is the snapshot
+plus the few events appended since. The snapshot keeps the original
+`finance_balance.json` layout, with the journal position added.
+
+Writers in any number of threads and processes are serialized by an
+advisory lock on `finance_balance.journal.lock`. Before appending, a
+writer catches up on events the others appended, so every event builds
+on the latest balance. adjust() reads the balance, computes the new one
+and appends it all under the lock, so a concurrent adjustment is never
+lost. The journal sequence number doubles as a version: append() with
+expected_sequence appends only if the sequence has not moved since a
+caller read it outside the lock.
+"""
+import datetime
+import gzip
+import json
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: byte-range locks via msvcrt
+    fcntl = None
+    import msvcrt
+
+# Rewrite the snapshot after this many appended events
+SNAPSHOT_EVERY = 50
+# Move covered events into a gzip archive once the live journal reaches this size
+COMPACT_BYTES = 256 * 1024
+
+EVENT_TYPES = ('set', 'adjust', 'restore')
+
+
+class BalanceConflict(Exception):
+    """The journal moved past the version an update was based on"""
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, re-entrant within one instance.
+
+    Threads sharing the instance queue on a threading lock; other
+    instances and processes queue on the OS lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError:
+                self._thread_lock.release()
+                raise
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting
+                    while True:
+                        try:
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except BaseException:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+        return False
+
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file, fsync it and rename it over path"""
+    # A temp name per writer, so concurrent writers never share a half-written file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BalanceJournal:
+    """Durable, append-only balance history for one balance file"""
+
+    def __init__(self, snapshot_path, journal_path=None, snapshot_every=SNAPSHOT_EVERY,
+                 compact_bytes=COMPACT_BYTES):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + '.journal'
+        self.snapshot_every = snapshot_every
+        self.compact_bytes = compact_bytes
+        self.balance = 0.0
+        self.sequence = 0
+        self.last_updated = None
+        self.lock = FileLock(f"{self.journal_path}.lock")
+        self._snapshot_sequence = 0
+        self._journal_size = 0
+        # Identity of the files as last read, to notice other writers' rotations
+        self._journal_inode = None
+        self._snapshot_mtime = None
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return {}
+        with open(self.snapshot_path, 'r') as f:
+            return json.load(f)
+
+    def _snapshot_stamp(self):
+        try:
+            return os.stat(self.snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Load the balance from the snapshot plus the journal tail; returns the balance.
+
+        Reads without the lock, so read-only use creates no files. The lock
+        is taken, and the files read again, only when a torn tail or an
+        interrupted compaction needs repairing or another writer rotated
+        the files mid-read.
+        """
+        try:
+            clean = self._load(repair=False)
+        except FileNotFoundError:
+            # Another writer rotated the journal mid-read
+            clean = False
+        if not clean:
+            with self.lock:
+                self._load()
+        return self.balance
+
+    def _load(self, repair=True):
+        """Read the snapshot and journal tail.
+
+        Without repair nothing is written: returns False instead when the
+        files need repairing or changed identity while being read.
+        """
+        self._snapshot_mtime = self._snapshot_stamp()
+        snapshot = self._read_snapshot()
+        self.balance = float(snapshot.get('current_balance', 0.0))
+        self.sequence = self._snapshot_sequence = snapshot.get('sequence', 0)
+        self.last_updated = snapshot.get('last_updated')
+        offset = snapshot.get('journal_offset', 0)
+        pending = f"{self.journal_path}.compacting"
+
+        if not os.path.exists(self.journal_path):
+            self._journal_size = 0
+            self._journal_inode = None
+        else:
+            size = os.path.getsize(self.journal_path)
+            if offset > size:
+                # The journal was rotated after this snapshot was written
+                offset = 0
+
+            good_end = offset
+            with open(self.journal_path, 'rb') as f:
+                self._journal_inode = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break
+                    good_end += len(line)
+                    if event['seq'] > self.sequence:
+                        self._apply(event)
+                size = max(size, f.tell())
+
+            if good_end < size:
+                if not repair:
+                    return False
+                # Drop a torn final line left by a crash mid-append
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_end)
+            self._journal_size = good_end
+
+        if os.path.exists(pending):
+            if not repair:
+                return False
+            # Finish a compaction interrupted after the journal was rotated
+            self._archive(pending)
+        return repair or self._files_unchanged()
+
+    def _files_unchanged(self):
+        """Whether the snapshot and journal are still the files _load() read"""
+        try:
+            inode = os.stat(self.journal_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        return inode == self._journal_inode and self._snapshot_stamp() == self._snapshot_mtime
+
+    def refresh(self):
+        """Apply events other writers appended since this journal last read; returns the balance.
+
+        Reads only the new tail of the journal; a rotated journal or a
+        rewritten snapshot means starting again from the snapshot.
+        """
+        with self.lock:
+            try:
+                stat = os.stat(self.journal_path)
+            except FileNotFoundError:
+                stat = None
+            if (stat is None or stat.st_ino != self._journal_inode or stat.st_size < self._journal_size
+                    or self._snapshot_stamp() != self._snapshot_mtime):
+                self._load()
+                return self.balance
+            if stat.st_size == self._journal_size:
+                return self.balance
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_size)
+                tail = f.read(stat.st_size - self._journal_size)
+            for line in tail.splitlines(keepends=True):
+                try:
+                    event = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    event = None
+                if event is None or event['seq'] != self.sequence + 1:
+                    self._load()
+                    return self.balance
+                self._apply(event)
+                self._journal_size += len(line)
+            return self.balance
+
+    def _apply(self, event):
+        self.balance = float(event['balance'])
+        self.sequence = event['seq']
+        self.last_updated = event['time']
+
+    def append(self, event_type, balance, amount=None, description=None, expected_sequence=None, **extra):
+        """Append one event and return it; balance is the balance after the event.
+
+        With expected_sequence, the event is appended only if no other
+        event was appended since that sequence (else BalanceConflict).
+        """
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown balance event type: {event_type}")
+        with self.lock:
+            self.refresh()
+            if expected_sequence is not None and expected_sequence != self.sequence:
+                raise BalanceConflict(f"Balance changed: expected version {expected_sequence}, "
+                                      f"found {self.sequence}")
+            event = {'seq': self.sequence + 1, 'time': _now(), 'type': event_type, 'balance': float(balance)}
+            if amount is not None:
+                event['amount'] = float(amount)
+            if description is not None:
+                event['description'] = description
+            event.update(extra)
+            line = (json.dumps(event) + '\n').encode()
+
+            # A single O_APPEND write of a whole line, synced before we report success
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+                self._journal_inode = os.fstat(fd).st_ino
+            finally:
+                os.close(fd)
+            self._journal_size += len(line)
+            self._apply(event)
+
+            if self.sequence - self._snapshot_sequence >= self.snapshot_every:
+                self._write_snapshot()
+            if self._journal_size >= self.compact_bytes:
+                self.compact()
+        return event
+
+    def set(self, balance, description=None):
+        return self.append('set', balance, description=description)
+
+    def adjust(self, amount, description="Balance adjustment"):
+        """Add amount to the latest balance.
+
+        The balance is read, the new one computed and the event appended
+        under one lock, so no other thread or process can append in between.
+        """
+        with self.lock:
+            self.refresh()
+            return self.append('adjust', self.balance + amount, amount=amount, description=description,
+                               expected_sequence=self.sequence)
+
+    def restore(self, balance, **extra):
+        return self.append('restore', balance, **extra)
+
+    def snapshot(self):
+        """Atomically rewrite the snapshot to cover the whole journal"""
+        with self.lock:
+            self.refresh()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        atomic_write_json(self.snapshot_path, {
+            'current_balance': self.balance,
+            'last_updated': self.last_updated or _now(),
+            'sequence': self.sequence,
+            'journal_offset': self._journal_size
+        })
+        self._snapshot_sequence = self.sequence
+        self._snapshot_mtime = self._snapshot_stamp()
+
+    def compact(self):
+        """Move the journal into a gzip archive segment and start an empty one"""
+        with self.lock:
+            self.refresh()
+            if not os.path.exists(self.journal_path):
+                return
+            self._write_snapshot()
+            pending = f"{self.journal_path}.compacting"
+            os.replace(self.journal_path, pending)
+            self._journal_size = 0
+            self._journal_inode = None
+            self._write_snapshot()
+            self._archive(pending)
+
+    def _archive(self, pending):
+        archive = f"{self.journal_path}.{self.sequence:012d}.gz"
+        with open(pending, 'rb') as src, gzip.open(f"{archive}.tmp", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f"{archive}.tmp", archive)
+        os.remove(pending)
+
+    def archives(self):
+        """Archived journal segments, oldest first"""
+        directory = os.path.dirname(os.path.abspath(self.journal_path))
+        prefix = os.path.basename(self.journal_path) + '.'
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith('.gz')
+        )
+
+    def history(self):
+        """Every recorded event, oldest first (archives, then the live journal)"""
+        for archive in self.archives():
+            with gzip.open(archive, 'rb') as f:
+                for line in f:
+                    yield json.loads(line)
+        pending = f"{self.journal_path}.compacting"
+        for path in (pending, self.journal_path):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    for line in f:
+                        if line.endswith(b'\n'):
+                            yield json.loads(line)
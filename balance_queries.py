@@ -0,0 +1,107 @@
+"""Precomputed queries over a forecast balance series (numpy only).
+
+RangeMinimum is a sparse table of argmin indices: built once in
+O(n log n), it answers "lowest balance between day i and day j" in O(1)
+by comparing two overlapping power-of-two blocks, and answers a whole
+array of ranges (such as every pay period) in one vectorized lookup.
+ThresholdIndex keeps prefix minima for "first day below X" queries.
+"""
+import numpy as np
+
+
+class RangeMinimum:
+    """Sparse-table range-minimum index over a 1-D series"""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        n = len(self.values)
+        # levels[k][i] is the index of the minimum of values[i:i + 2**k]
+        # (leftmost on ties)
+        self.levels = [np.arange(n, dtype=np.int32)]
+        width = 1
+        while width * 2 <= n:
+            previous = self.levels[-1]
+            left = previous[:n - width * 2 + 1]
+            right = previous[width:n - width + 1]
+            self.levels.append(np.where(self.values[right] < self.values[left], right, left))
+            width *= 2
+
+    def __len__(self):
+        return len(self.values)
+
+    def argmin(self, lo, hi):
+        """Index of the minimum of values[lo:hi + 1] (inclusive bounds)"""
+        lo, hi = int(lo), int(hi)
+        if not 0 <= lo <= hi < len(self.values):
+            raise IndexError(f"Range {lo}..{hi} outside 0..{len(self.values) - 1}")
+        k = (hi - lo + 1).bit_length() - 1
+        left = self.levels[k][lo]
+        right = self.levels[k][hi - (1 << k) + 1]
+        return int(right if self.values[right] < self.values[left] else left)
+
+    def min(self, lo, hi):
+        return float(self.values[self.argmin(lo, hi)])
+
+    def argmin_many(self, lo, hi):
+        """Vectorized argmin for arrays of inclusive ranges"""
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        if len(lo) == 0:
+            return np.empty(0, dtype=np.int64)
+        if lo.min() < 0 or hi.max() >= len(self.values) or (lo > hi).any():
+            raise IndexError("Range outside the series")
+        k = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+        left = np.empty(len(lo), dtype=np.int64)
+        right = np.empty(len(lo), dtype=np.int64)
+        for level in np.unique(k):
+            rows = k == level
+            table = self.levels[level]
+            left[rows] = table[lo[rows]]
+            right[rows] = table[hi[rows] - (1 << int(level)) + 1]
+        return np.where(self.values[right] < self.values[left], right, left)
+
+
+def period_bounds(boundary):
+    """(starts, ends) inclusive day ranges cut where boundary is True; the first
+    period starts on day 0 even without a boundary there"""
+    n = len(boundary)
+    if not n:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(boundary)
+    if not len(starts) or starts[0] != 0:
+        starts = np.concatenate([[0], starts])
+    ends = np.append(starts[1:], n) - 1
+    return starts, ends
+
+
+class ThresholdIndex:
+    """Prefix minima of a series, for first-crossing queries at any threshold.
+
+    The running minimum never increases, so the first day below X is a
+    binary search for X in it: O(log n) per threshold, and an array of
+    thresholds is answered with one searchsorted.
+    """
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        # Negated so the searched array is ascending
+        self._neg_prefix_min = -np.minimum.accumulate(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def first_below(self, threshold):
+        """Index of the first value below threshold, or len(values) if none is.
+
+        threshold may be a scalar or an array of thresholds.
+        """
+        first = np.searchsorted(self._neg_prefix_min, -np.asarray(threshold, dtype=float), side='right')
+        return int(first) if np.ndim(first) == 0 else first
+
+    def intervals_below(self, threshold):
+        """(starts, ends) inclusive index ranges of each run of values below threshold"""
+        if self.first_below(threshold) == len(self.values):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        below = np.concatenate([[False], self.values < threshold, [False]])
+        edges = np.flatnonzero(below[1:] != below[:-1])
+        return edges[0::2], edges[1::2] - 1
@@ -0,0 +1,171 @@
+"""Forecast many household profiles in parallel, without streamlit.
+
+Profiles are JSON objects such as
+
+    {"name": "smith", "balance": 1200.0, "daily_expenses": 80.0,
+     "bi_weekly_pay": 2400.0, "pay_anchor": "2025-06-13",
+     "social_security": 0.0,
+     "monthly_expenses": {"1": [["Rent", 1500.0]], "15": [["Phone", 60.0]]}}
+
+read from a .json file (one profile or a list), a .jsonl file (one per
+line) or a directory of such files. Usage:
+
+    python batch_forecast.py profiles/ --days 365 --output results.csv
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import forecast_engine
+import recurrence
+
+RESULT_FIELDS = ['name', 'start_balance', 'final_balance', 'min_balance', 'min_balance_date',
+                 'days_negative', 'first_negative_date']
+
+# Profiles per task sent to a worker; amortizes pickling and scheduling
+CHUNK_SIZE = 64
+
+
+def _parse_date(value, default):
+    return datetime.date.fromisoformat(value) if value else default
+
+
+def profile_rules(profile):
+    """Recurrence rules for a profile dict"""
+    monthly_expenses = {
+        int(day): [tuple(bill) for bill in bills]
+        for day, bills in profile.get('monthly_expenses', {}).items()
+    }
+    rules = forecast_engine.household_rules(
+        monthly_expenses,
+        profile.get('bi_weekly_pay', 0.0),
+        profile.get('social_security', 0.0),
+        _parse_date(profile.get('pay_anchor'), forecast_engine.PAY_ANCHOR),
+        _parse_date(profile.get('social_security_start'), forecast_engine.SOCIAL_SECURITY_START)
+    )
+    # Zero-amount income rules would only add empty events
+    return [rule for rule in rules if rule.amount != 0]
+
+
+def forecast_profile(profile, start_date, num_days):
+    """Summary row for one profile: min balance, days negative, first negative date"""
+    schedule = recurrence.compile_rules(profile_rules(profile))
+    balance = float(profile.get('balance', 0.0))
+    flow = forecast_engine.build_daily_cash_flow(
+        start_date, num_days, profile.get('daily_expenses', 0.0), schedule
+    )
+    balances = forecast_engine.running_balances(balance, flow['daily_change'])[1:]
+
+    row = {'name': profile.get('name', ''), 'start_balance': balance}
+    if not num_days:
+        row.update(final_balance=balance, min_balance=balance, min_balance_date='',
+                   days_negative=0, first_negative_date='')
+        return row
+    negative = balances < 0
+    low = int(np.argmin(balances))
+    row.update(
+        final_balance=round(float(balances[-1]), 2),
+        min_balance=round(float(balances[low]), 2),
+        min_balance_date=(start_date + datetime.timedelta(days=low)).isoformat(),
+        days_negative=int(np.count_nonzero(negative)),
+        first_negative_date=(
+            (start_date + datetime.timedelta(days=int(np.argmax(negative)))).isoformat()
+            if negative.any() else ''
+        )
+    )
+    return row
+
+
+def _forecast_chunk(args):
+    profiles, start_date, num_days = args
+    return [forecast_profile(profile, start_date, num_days) for profile in profiles]
+
+
+def load_profiles(path):
+    """Yield profile dicts from a .json/.jsonl file or a directory of them"""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(('.json', '.jsonl')):
+                yield from load_profiles(os.path.join(path, name))
+        return
+    with open(path, 'r') as f:
+        if path.endswith('.jsonl'):
+            data = (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                data = [data]
+        for n, profile in enumerate(data):
+            profile.setdefault('name', f"{os.path.splitext(os.path.basename(path))[0]}-{n}")
+            yield profile
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(profiles, start_date, num_days, workers=None, chunk_size=CHUNK_SIZE):
+    """Forecast every profile, spreading chunks over a process pool; yields rows in order"""
+    tasks = ((chunk, start_date, num_days) for chunk in _chunks(profiles, chunk_size))
+    if workers == 1:
+        for task in tasks:
+            yield from _forecast_chunk(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rows in pool.map(_forecast_chunk, tasks):
+            yield from rows
+
+
+def write_results(rows, output):
+    """Write summary rows as CSV, or JSON lines when output ends in .jsonl; returns the count"""
+    count = 0
+    target = open(output, 'w', newline='') if output != '-' else contextlib.nullcontext(sys.stdout)
+    with target as f:
+        if output.endswith('.jsonl'):
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+                count += 1
+        else:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast many household profiles in parallel")
+    parser.add_argument('profiles', help="profile .json/.jsonl file or directory")
+    parser.add_argument('--days', type=int, default=365, help="forecast horizon in days")
+    parser.add_argument('--start', help="as-of date (YYYY-MM-DD), default today")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', default='-', help="results .csv or .jsonl (default: stdout)")
+    args = parser.parse_args(argv)
+
+    start_date = _parse_date(args.start, datetime.date.today())
+    started = time.perf_counter()
+    rows = run_batch(load_profiles(args.profiles), start_date, args.days, args.workers, args.chunk_size)
+    count = write_results(rows, args.output)
+    elapsed = time.perf_counter() - started
+    print(f"Forecast {count} profiles over {args.days} days in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
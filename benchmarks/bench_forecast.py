@@ -0,0 +1,210 @@
+"""Benchmarks for the forecasting and plotting hot paths.
+
+Times the forecaster entry points over horizons from a week to 100 years
+and schedules from 20 to 10,000 recurring bills, recording the best wall
+time and the tracemalloc peak of each case. Everything runs offline
+against a fixed as-of date and a seeded synthetic schedule, so a run is
+reproducible. Usage (from the repository root):
+
+    python benchmarks/bench_forecast.py                   # compare with baseline.json
+    python benchmarks/bench_forecast.py --update-baseline # re-record the baseline
+    python benchmarks/bench_forecast.py --quick           # skip the largest cases
+
+The comparison exits non-zero when a case is slower, or peaks higher,
+than its baseline by more than --threshold. Baselines are specific to
+the machine that recorded them; re-record after moving to new hardware.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from finance_forecaster import PersonalFinanceForecaster
+
+AS_OF = datetime.date(2025, 7, 1)
+SEED = 20250701
+HORIZONS = [7, 30, 365, 3650, 36500]
+SCHEDULE_SIZES = [20, 100, 1000, 10000]
+# Cases this large are skipped by --quick
+QUICK_LIMIT = 365 * 1000
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Allowed slowdown/growth ratio, and differences too small to count as regressions
+THRESHOLD = 2.0
+MIN_SECONDS = 0.005
+MIN_BYTES = 256 * 1024
+
+
+def synthetic_bills(count, seed=SEED):
+    """count monthly bills spread over the month, in monthly_expenses form"""
+    rng = random.Random(seed)
+    bills = {}
+    for i in range(count):
+        day = rng.randint(1, 31)
+        bills.setdefault(day, []).append((f"Bill {i}", round(rng.uniform(5, 400), 2)))
+    return bills
+
+
+def make_forecaster(schedule_size, directory):
+    forecaster = PersonalFinanceForecaster(balance_file=os.path.join(directory, 'balance.json'))
+    forecaster.current_balance = 2500.0
+    forecaster.monthly_expenses = synthetic_bills(schedule_size)
+    return forecaster
+
+
+def _generate_forecast_data(forecaster, num_days):
+    forecaster._last_forecast = None
+    return forecaster.generate_forecast_data(num_days, forecaster.compute_forecast(num_days, AS_OF))
+
+
+def _create_cash_flow_plot(forecaster, num_days):
+    forecaster._last_forecast = None
+    fig, _, _ = forecaster.create_cash_flow_plot(num_days, forecaster.compute_forecast(num_days, AS_OF))
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _pay_dates(forecaster, num_days):
+    return forecaster.get_bi_weekly_pay_dates(AS_OF, num_days)
+
+
+def _social_security_dates(forecaster, num_days):
+    return forecaster.get_social_security_dates(AS_OF, num_days)
+
+
+def _monthly_expenses_summary(forecaster, num_days):
+    return forecaster.get_monthly_expenses_summary()
+
+
+# name -> (function, whether the horizon matters); the forecast functions
+# drop the last forecast so every repeat measures a full computation
+BENCHMARKS = {
+    'generate_forecast_data': (_generate_forecast_data, True),
+    'create_cash_flow_plot': (_create_cash_flow_plot, True),
+    'get_bi_weekly_pay_dates': (_pay_dates, True),
+    'get_social_security_dates': (_social_security_dates, True),
+    'get_monthly_expenses_summary': (_monthly_expenses_summary, False),
+}
+
+
+def cases(names, quick=False):
+    """(case id, benchmark name, schedule size, horizon) in a stable order"""
+    for name in names:
+        _, uses_horizon = BENCHMARKS[name]
+        for size in SCHEDULE_SIZES:
+            for num_days in (HORIZONS if uses_horizon else [HORIZONS[0]]):
+                if quick and size * num_days > QUICK_LIMIT:
+                    continue
+                case_id = f"{name}[items={size},days={num_days}]" if uses_horizon else f"{name}[items={size}]"
+                yield case_id, name, size, num_days
+
+
+def measure(function, forecaster, num_days, repeat=5):
+    """Best wall time over repeat runs, then the tracemalloc peak of one more run"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function(forecaster, num_days)
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(forecaster, num_days)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+def run(names, repeat=5, quick=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        forecasters = {}
+        for case_id, name, size, num_days in cases(names, quick):
+            if size not in forecasters:
+                forecasters[size] = make_forecaster(size, directory)
+            function, _ = BENCHMARKS[name]
+            seconds, peak = measure(function, forecasters[size], num_days, repeat)
+            results[case_id] = {'seconds': round(seconds, 6), 'peak_bytes': peak}
+            print(f"{case_id:<60}{seconds * 1000:>10.2f} ms{peak / 1024:>12,.0f} KiB", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Regression messages for cases worse than their baseline by more than threshold"""
+    regressions = []
+    for case_id, current in results.items():
+        previous = baseline.get(case_id)
+        if previous is None:
+            continue
+        if (current['seconds'] > previous['seconds'] * threshold
+                and current['seconds'] - previous['seconds'] > MIN_SECONDS):
+            regressions.append(f"{case_id}: {previous['seconds'] * 1000:.2f} ms -> "
+                               f"{current['seconds'] * 1000:.2f} ms")
+        if (current['peak_bytes'] > previous['peak_bytes'] * threshold
+                and current['peak_bytes'] - previous['peak_bytes'] > MIN_BYTES):
+            regressions.append(f"{case_id}: peak {previous['peak_bytes'] / 1024:,.0f} KiB -> "
+                               f"{current['peak_bytes'] / 1024:,.0f} KiB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting and plotting hot paths")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case (best is kept)")
+    parser.add_argument('--quick', action='store_true', help="skip the largest horizon/schedule cases")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="allowed slowdown or memory growth ratio before failing")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="record this run as the new baseline instead of comparing")
+    parser.add_argument('--output', help="also write this run's results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.repeat, args.quick)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Recorded {len(results)} cases in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        return 1
+    print(f"OK: no case regressed beyond {args.threshold:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Stress test for concurrent balance adjustments.
+
+Starts several processes, each with several threads sharing one
+PersonalFinanceForecaster. Every thread applies seeded random
+adjustments through update_balance. The journal is configured to
+snapshot and compact often, so rotations race with appends too. A
+fresh load must then show every adjustment:
+- the final balance equals the opening balance plus their sum
+- the event sequence is gapless
+Usage (from the repository root):
+
+    python benchmarks/stress_balance.py                        # 8 processes x 4 threads x 25
+    python benchmarks/stress_balance.py --processes 16 --adjustments 100
+
+Exits non-zero when an adjustment was lost or the history has a gap.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from balance_journal import BalanceJournal  # noqa: E402
+from finance_forecaster import PersonalFinanceForecaster  # noqa: E402
+
+OPENING_BALANCE = 1000.0
+
+
+def worker(balance_file, process, threads, adjustments, snapshot_every, compact_bytes, results):
+    """One process: threads adjusting through a shared forecaster; reports (cents, errors)"""
+    forecaster = PersonalFinanceForecaster(balance_file)
+    forecaster.journal.snapshot_every = snapshot_every
+    forecaster.journal.compact_bytes = compact_bytes
+    totals = [0] * threads
+
+    def run(thread):
+        rng = random.Random(process * 1000 + thread)
+        for i in range(adjustments):
+            cents = rng.randint(-5000, 5000) or 1
+            forecaster.update_balance(cents / 100, f"stress {process}.{thread}.{i}")
+            totals[thread] += cents
+
+    pool = [threading.Thread(target=run, args=(thread,)) for thread in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((sum(totals), forecaster.pop_errors()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent balance adjustment stress test")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--adjustments', type=int, default=25, help="adjustments per thread")
+    parser.add_argument('--snapshot-every', type=int, default=7)
+    parser.add_argument('--compact-bytes', type=int, default=4096)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        balance_file = os.path.join(directory, 'finance_balance.json')
+        PersonalFinanceForecaster(balance_file).set_current_balance(OPENING_BALANCE)
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(
+                balance_file, process, args.threads, args.adjustments,
+                args.snapshot_every, args.compact_bytes, results))
+            for process in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        expected_cents = round(OPENING_BALANCE * 100) + sum(cents for cents, _ in reports)
+        errors = [error for _, process_errors in reports for error in process_errors]
+        journal = BalanceJournal(balance_file)
+        balance = journal.load()
+        sequences = [event['seq'] for event in journal.history()]
+
+    total = args.processes * args.threads * args.adjustments
+    print(f"{total} adjustments from {args.processes} processes x {args.threads} threads "
+          f"in {elapsed:.2f}s ({total / elapsed:,.0f}/s)")
+    failures = []
+    if errors:
+        failures.append(f"{len(errors)} errors, first: {errors[0]}")
+    if round(balance * 100) != expected_cents:
+        failures.append(f"balance {balance:,.2f} != expected {expected_cents / 100:,.2f}")
+    if sequences != list(range(1, total + 2)):
+        failures.append(f"history has {len(sequences)} events, expected a gapless 1..{total + 1}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if not failures:
+        print(f"OK: final balance {balance:,.2f} matches, {len(sequences)} events in sequence")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
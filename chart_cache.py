@@ -0,0 +1,194 @@
+"""Content-addressed cache of rendered chart images (PNG/SVG bytes).
+
+A chart is keyed by a sha256 of everything it is drawn from: the forecast
+arrays, the start date and opening balance, and the image options. Equal
+inputs from any session map to the same key, so a repeat view is a memory
+or disk lookup instead of a matplotlib render. Both tiers are bounded by
+total bytes and evict least recently used images first.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import perf_timing
+
+# Bump when forecast_plot changes what a chart looks like
+CHART_VERSION = 2
+
+MIME_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+MEMORY_BYTES = 32 * 1024 * 1024
+DISK_BYTES = 256 * 1024 * 1024
+CACHE_DIR = '.chart_cache'
+
+
+def chart_key(result, fmt='png', dpi=100):
+    """Hex sha256 of the forecast data and chart options"""
+    if fmt not in MIME_TYPES:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    digest = hashlib.sha256()
+    digest.update(f"v{CHART_VERSION}|{fmt}|{dpi}|{result.start_date.isoformat()}|"
+                  f"{result.opening_balance!r}|{result.num_days}".encode())
+    for array in (result.daily_change, result.balance, result.is_payday, result.is_ss,
+                  result.bill_total):
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def render_chart(result, fmt='png', dpi=100):
+    """Draw the cash flow chart and return the encoded image bytes"""
+    import matplotlib.pyplot as plt
+    import forecast_plot
+
+    with perf_timing.span('chart_render'):
+        fig, _, _ = forecast_plot.create_cash_flow_figure(result)
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, dpi=dpi)
+            return buffer.getvalue()
+        finally:
+            # Figures are never reused once encoded; closing frees them right away
+            plt.close(fig)
+
+
+class ChartCache:
+    """Memory and disk tiers of rendered chart bytes, each LRU-bounded by size"""
+
+    def __init__(self, directory=CACHE_DIR, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if directory:
+            self._scan_disk()
+
+    def _scan_disk(self):
+        """Index existing image files, oldest access first"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext[1:] not in MIME_TYPES:
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+        self._trim_disk()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _remember(self, name, data):
+        self._memory[name] = data
+        self._memory.move_to_end(name)
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        while self._disk_size > self.disk_bytes and self._disk:
+            name, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def _read_disk(self, name):
+        if not self.directory or name not in self._disk:
+            return None
+        try:
+            with open(self._path(name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._disk_size -= self._disk.pop(name)
+            return None
+        self._disk.move_to_end(name)
+        os.utime(self._path(name))
+        return data
+
+    def _write_disk(self, name, data):
+        if not self.directory:
+            return
+        tmp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        if name in self._disk:
+            self._disk_size -= self._disk.pop(name)
+        self._disk[name] = len(data)
+        self._disk_size += len(data)
+        self._trim_disk()
+
+    def get(self, key, fmt='png'):
+        """Cached image bytes for key, or None"""
+        name = f"{key}.{fmt}"
+        with self._lock:
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                self.hits += 1
+                return self._memory[name]
+            data = self._read_disk(name)
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(name, data)
+            return data
+
+    def put(self, key, data, fmt='png'):
+        name = f"{key}.{fmt}"
+        with self._lock:
+            if name in self._memory:
+                self._memory_size -= len(self._memory.pop(name))
+            self._remember(name, data)
+            self._write_disk(name, data)
+
+    def get_or_render(self, result, fmt='png', dpi=100):
+        """Image bytes for result, rendering and storing them on a miss"""
+        key = chart_key(result, fmt, dpi)
+        data = self.get(key, fmt)
+        if data is None:
+            data = render_chart(result, fmt, dpi)
+            self.put(key, data, fmt)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            for name in list(self._disk):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+            self._disk.clear()
+            self._disk_size = 0
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'size': len(self._memory),
+            'bytes': self._memory_size,
+            'disk_size': len(self._disk),
+            'disk_bytes': self._disk_size,
+            'hits': self.hits + self.disk_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
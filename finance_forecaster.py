@@ -0,0 +1,384 @@
+"""Personal finance forecaster core: balances, schedule and forecasts.
+
+Importable without streamlit, matplotlib or pandas; matplotlib is only
+loaded when a chart is drawn.
+"""
+import datetime
+from datetime import timedelta
+import hashlib
+import json
+import logging
+from types import MappingProxyType
+
+import numpy as np
+
+import forecast_engine
+import perf_timing
+import recurrence
+from balance_journal import BalanceJournal
+
+logger = logging.getLogger(__name__)
+
+# Incremental forecast updates: rebuild from scratch after this many to
+# shed accumulated rounding, and the allowed drift in verify mode
+FULL_RECOMPUTE_EVERY = 64
+INCREMENTAL_TOLERANCE = 1e-6
+
+# Assigning any of these marks the schedule for recompiling. monthly_expenses
+# and extra_rules are read-only views, so they cannot change any other way
+SCHEDULE_ATTRIBUTES = frozenset((
+    'monthly_expenses', 'extra_rules', 'bi_weekly_pay', 'social_security',
+    'pay_anchor', 'social_security_start',
+))
+
+
+class PersonalFinanceForecaster:
+    def __init__(self, balance_file=None):
+        self.balance_file = balance_file or "finance_balance.json"
+        
+        # Errors from disk I/O, for the UI (or a CLI) to show
+        self.errors = []
+        
+        # Load saved balance or start with 0
+        self.current_balance = self.load_balance()
+        self.daily_expenses = 100.0
+        
+        # Monthly recurring expenses from Excel file; change them through
+        # add_monthly_expense/remove_monthly_expense or by assigning a new dict
+        self.monthly_expenses = {
+            1: [("Davis Schools Lunch", 20.00)],
+            2: [("Kindle", 13.93), ("Audible", 16.03), ("Harp", 150.00), ("Kohls", 100.00), ("Grass Roots Coop", 158.76)],
+            4: [("Kindle", 12.86), ("Paypal Instant", 36.24)],
+            5: [("Mint mobile", 130.00)],
+            6: [("T-MOBILE Handset", 83.37), ("South Davis Rec", 40.00)],
+            8: [("Mint mobile", 130.76)],
+            12: [("JSB Guitar", 35.00), ("Mortgage", 930.00)],
+            13: [("Internet", 61.10)],
+            15: [("Netflix", 20.00), ("Claude", 22.00)],
+            18: [("Phone Rob", 124.64)],
+            19: [("ChatGPT", 20.00), ("CAP 1 Mike", 110.00), ("Sewer", 75.00)],
+            20: [("Foundation Furnace", 110.00)],
+            21: [("Cap 1 Rob", 220.00), ("Merinda Harp", 50.00)],
+            22: [("Allstate Car insurance", 322.88), ("T-Mobile", 113.00)],
+            23: [("Psych", 25.00)],
+            25: [("Car Payment", 420.00)],
+            27: [("Ryan xfer", 300.00), ("Gas", 30.00), ("NYTimes", 25.00), ("Psych", 25.00), ("Paypal", 30.00)],
+            28: [("Paypal", 13.00)],
+            29: [("Orthodontics", 119.00), ("Paypal 2", 26.95), ("Dominion", 74.00)],
+            30: [("Rose", 25.00), ("Paypal 2", 26.95)]
+        }
+        
+        self.bi_weekly_pay = 2700.0
+        self.social_security = 2600.0
+        self.pay_anchor = forecast_engine.PAY_ANCHOR
+        self.social_security_start = forecast_engine.SOCIAL_SECURITY_START
+        
+        # Additional recurrence rules beyond pay, Social Security and monthly bills
+        self.extra_rules = ()
+        self._compiled = None
+        # Per-category sub-schedules of _compiled, for pay and Social Security dates
+        self._category_schedules = {}
+        
+        # Last forecast, updated incrementally when only the balance, daily
+        # expenses or a single monthly bill change
+        self._last_forecast = None
+        self._incremental_updates = 0
+        self.verify_incremental = False
+
+    def __setattr__(self, name, value):
+        if name in SCHEDULE_ATTRIBUTES:
+            object.__setattr__(self, '_schedule_dirty', True)
+        object.__setattr__(self, name, value)
+
+    @property
+    def monthly_expenses(self):
+        """Read-only {day: ((description, amount), ...)} view of the monthly bills"""
+        return MappingProxyType(self._monthly_expenses)
+
+    @monthly_expenses.setter
+    def monthly_expenses(self, expenses):
+        self._monthly_expenses = {day: tuple(bills) for day, bills in expenses.items() if bills}
+
+    def load_balance(self):
+        """Load the saved balance from the latest snapshot plus the journal tail"""
+        try:
+            with perf_timing.span('load_balance'):
+                self.journal = BalanceJournal(self.balance_file)
+                return self.journal.load()
+        except Exception as e:
+            self._report_error(f"Error loading balance: {e}")
+            return 0.0
+
+    def save_balance(self):
+        """Record the current balance in the balance journal"""
+        try:
+            with perf_timing.span('save_balance'):
+                self.journal.set(self.current_balance)
+        except Exception as e:
+            self._report_error(f"Error saving balance: {e}")
+
+    def _report_error(self, message):
+        logger.error(message)
+        self.errors.append(message)
+
+    def pop_errors(self):
+        """Return and clear the errors reported since the last call"""
+        errors, self.errors = self.errors, []
+        return errors
+
+    def set_current_balance(self, balance):
+        """Update the current balance and save it"""
+        self.current_balance = float(balance)
+        self.save_balance()
+
+    def update_balance(self, amount, description="Balance adjustment"):
+        """Add or subtract an amount from the current balance.
+
+        The adjustment applies to the latest saved balance, including
+        adjustments other sessions or processes saved since this one loaded.
+        """
+        try:
+            with perf_timing.span('save_balance'):
+                self.journal.adjust(amount, description)
+            self.current_balance = self.journal.balance
+        except Exception as e:
+            self.current_balance += amount
+            self._report_error(f"Error saving balance: {e}")
+        return f"{description}: {amount:+.2f}"
+
+    def restore_balance(self, balance, daily_expenses):
+        """Restore balance and daily expenses from a backup file"""
+        self.current_balance = float(balance)
+        self.daily_expenses = float(daily_expenses)
+        try:
+            with perf_timing.span('save_balance'):
+                self.journal.restore(self.current_balance, daily_expenses=self.daily_expenses)
+        except Exception as e:
+            self._report_error(f"Error saving balance: {e}")
+
+    def get_balance_history(self):
+        """All recorded balance events, oldest first"""
+        return list(self.journal.history())
+
+    def find_fourth_wednesday(self, year, month):
+        """Find the 4th Wednesday of a given month"""
+        return recurrence.nth_weekday_of_month(year, month, 2, 4)
+
+    def build_rules(self):
+        """All recurring income and bills as recurrence rules"""
+        rules = forecast_engine.household_rules(
+            self.monthly_expenses, self.bi_weekly_pay, self.social_security,
+            self.pay_anchor, self.social_security_start
+        )
+        return rules + list(self.extra_rules)
+
+    def add_rule(self, rule):
+        """Add a recurrence rule to the schedule"""
+        self.extra_rules = self.extra_rules + (rule,)
+
+    def invalidate_schedule(self):
+        """Rebuild and re-fingerprint the schedule on next use"""
+        self._schedule_dirty = True
+
+    def get_schedule(self):
+        """Compiled schedule, rebuilt and fingerprinted only after the rules change"""
+        if self._compiled is None or self._schedule_dirty:
+            rules = self.build_rules()
+            fingerprint = self._fingerprint(rules)
+            if self._compiled is None or self._compiled[0] != fingerprint:
+                with perf_timing.span('schedule'):
+                    self._compiled = (fingerprint, recurrence.compile_rules(rules))
+                self._category_schedules = {}
+            self._schedule_dirty = False
+        return self._compiled[1]
+
+    def _category_schedule(self, category):
+        """The schedule's rules of one category, compiled on their own"""
+        schedule = self.get_schedule()
+        compiled = self._category_schedules.get(category)
+        if compiled is None:
+            compiled = self._category_schedules[category] = recurrence.compile_rules(
+                [rule for rule in schedule.rules if rule.category == category]
+            )
+        return compiled
+
+    def _rule_dates(self, category, start_date, num_days):
+        # Inclusive of the end date
+        offsets, _ = self._category_schedule(category).occurrences(start_date, num_days + 1)
+        return [start_date + timedelta(days=int(o)) for o in offsets]
+
+    def _forecast_dates(self, category, flags, result):
+        """Days flagged in a forecast plus its end date when the category falls on it"""
+        dates = [result.start_date + timedelta(days=int(i)) for i in np.flatnonzero(flags)]
+        end = result.start_date + timedelta(days=result.num_days)
+        if len(self._category_schedule(category).occurrences(end, 1)[0]):
+            dates.append(end)
+        return dates
+
+    def get_bi_weekly_pay_dates(self, start_date, num_days):
+        """Get all bi-weekly pay dates starting from the pay anchor (June 13, 2025)"""
+        return self._rule_dates('pay', start_date, num_days)
+
+    def get_social_security_dates(self, start_date, num_days):
+        """Get all Social Security payment dates (4th Wednesday)"""
+        return self._rule_dates('social_security', start_date, num_days)
+
+    def _fingerprint(self, rules):
+        keys = [rule.key() for rule in rules]
+        return hashlib.sha1(json.dumps(keys).encode()).hexdigest()
+
+    def schedule_fingerprint(self):
+        """Stable hash of the recurring schedule (bills, pay and Social Security)"""
+        self.get_schedule()
+        return self._compiled[0]
+
+    def forecast_key(self, num_days, start_date=None):
+        """Cache key covering every input the forecast depends on"""
+        if start_date is None:
+            start_date = datetime.date.today()
+        return (self.current_balance, self.daily_expenses, self.schedule_fingerprint(),
+                num_days, start_date.isoformat())
+
+    def compute_forecast(self, num_days=20, start_date=None):
+        """Compute the forecast once as a columnar ForecastResult"""
+        if start_date is None:
+            start_date = datetime.date.today()
+        
+        schedule = self.get_schedule()
+        key = (self._compiled[0], start_date, num_days)
+        last = self._last_forecast
+        
+        if last is not None and last[0] == key and self._incremental_updates < FULL_RECOMPUTE_EVERY:
+            # Same schedule and horizon: the forecast is linear in balance and daily expenses
+            result, balance, daily_expenses = last[1], last[2], last[3]
+            if self.daily_expenses != daily_expenses:
+                label = forecast_engine.transaction_labels(self.daily_expenses, schedule)
+                result = result.with_daily_expense_delta(self.daily_expenses - daily_expenses, label)
+            if self.current_balance != balance:
+                result = result.with_opening_balance(self.current_balance)
+            if result is not last[1]:
+                self._incremental_updates += 1
+                self._check_incremental(result)
+        else:
+            with perf_timing.span('forecast'):
+                result = forecast_engine.forecast(
+                    start_date, num_days, self.current_balance, self.daily_expenses, schedule
+                )
+            self._incremental_updates = 0
+        
+        self._last_forecast = (key, result, self.current_balance, self.daily_expenses)
+        return result
+
+    def first_date_below(self, floor=0.0, num_days=365, start_date=None):
+        """First date the forecast balance drops below floor, or None"""
+        return self.compute_forecast(num_days, start_date).first_date_below(floor)
+
+    def runway_days(self, floor=0.0, num_days=365, start_date=None):
+        """Days of runway before the balance drops below floor; floor may be an array"""
+        return self.compute_forecast(num_days, start_date).runway_days(floor)
+
+    def intervals_below(self, floor=0.0, num_days=365, start_date=None):
+        """(first_date, last_date) of each stretch the balance spends below floor"""
+        return self.compute_forecast(num_days, start_date).intervals_below(floor)
+
+    def add_monthly_expense(self, day, description, amount):
+        """Add a monthly bill, updating the last forecast only on the days it recurs"""
+        fingerprint = self.schedule_fingerprint()
+        self._monthly_expenses[day] = self._monthly_expenses.get(day, ()) + ((description, amount),)
+        self.invalidate_schedule()
+        self._apply_bill_change(day, description, -amount, fingerprint)
+
+    def remove_monthly_expense(self, day, description):
+        """Remove a monthly bill, updating the last forecast only on the days it recurred"""
+        fingerprint = self.schedule_fingerprint()
+        bills = self._monthly_expenses.get(day, ())
+        for i, (desc, amount) in enumerate(bills):
+            if desc == description:
+                bills = bills[:i] + bills[i + 1:]
+                break
+        else:
+            raise KeyError(f"No monthly expense {description!r} on day {day}")
+        if bills:
+            self._monthly_expenses[day] = bills
+        else:
+            del self._monthly_expenses[day]
+        self.invalidate_schedule()
+        self._apply_bill_change(day, description, amount, fingerprint)
+
+    def _apply_bill_change(self, day, description, amount, fingerprint):
+        """Apply one bill's delta to the last forecast if it was computed from the schedule with fingerprint"""
+        schedule = self.get_schedule()
+        last = self._last_forecast
+        if last is None:
+            return
+        if last[0][0] != fingerprint:
+            # Other schedule changes since the last forecast: recompute it in full
+            self._last_forecast = None
+            return
+        
+        (_, start_date, num_days), result, balance, daily_expenses = last
+        bill = recurrence.RecurrenceRule.monthly(description, amount, day, clamp=False)
+        offsets, _ = recurrence.compile_rules([bill]).occurrences(start_date, num_days)
+        result = result.with_rule_delta(
+            offsets, amount,
+            lambda: forecast_engine.build_calendar(start_date, num_days, schedule),
+            forecast_engine.transaction_labels(daily_expenses, schedule)
+        )
+        self._incremental_updates += 1
+        self._last_forecast = ((self._compiled[0], start_date, num_days), result, balance, daily_expenses)
+        if self.current_balance == balance and self.daily_expenses == daily_expenses:
+            self._check_incremental(result)
+
+    def _check_incremental(self, result):
+        """In verify mode, compare an incremental update against a full recomputation"""
+        if not self.verify_incremental:
+            return
+        full = forecast_engine.forecast(
+            result.start_date, result.num_days, self.current_balance, self.daily_expenses,
+            self.get_schedule()
+        )
+        difference = result.max_difference(full)
+        if difference > INCREMENTAL_TOLERANCE:
+            raise AssertionError(f"Incremental forecast differs from full recomputation by {difference}")
+
+    def generate_forecast_data(self, num_days=20, result=None):
+        """Generate forecast data and return it for display"""
+        if result is None:
+            result = self.compute_forecast(num_days)
+        
+        pay_dates = self._forecast_dates('pay', result.is_payday, result)
+        ss_dates = self._forecast_dates('social_security', result.is_ss, result)
+        daily_changes = [0] + result.daily_change.tolist()
+        return (result.rows(), result.chart_dates, result.chart_balances, daily_changes,
+                pay_dates, ss_dates)
+
+    def create_cash_flow_plot(self, num_days=20, result=None):
+        """Create matplotlib figure for cash flow"""
+        # matplotlib is only imported when a chart is actually drawn
+        import forecast_plot
+        
+        if result is None:
+            result = self.compute_forecast(num_days)
+        with perf_timing.span('chart_render'):
+            return forecast_plot.create_cash_flow_figure(result)
+
+    def get_monthly_expenses_summary(self):
+        """Get summary of monthly expenses"""
+        expenses_summary = []
+        total_monthly = 0
+        
+        for day in sorted(self.monthly_expenses.keys()):
+            day_total = 0
+            day_expenses = []
+            for desc, amount in self.monthly_expenses[day]:
+                day_expenses.append({'Description': desc, 'Amount': amount})
+                day_total += amount
+                total_monthly += amount
+            
+            expenses_summary.append({
+                'Day': day,
+                'Expenses': day_expenses,
+                'Day Total': day_total
+            })
+        
+        return expenses_summary, total_monthly
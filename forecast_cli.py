@@ -0,0 +1,135 @@
+"""Headless forecast command line: print or export a forecast without streamlit.
+
+    python forecast_cli.py --days 90
+    python forecast_cli.py --days 365 --format csv --output forecast.csv
+    python forecast_cli.py --days 60 --chart forecast.png
+    python forecast_cli.py --check-import-budget
+
+The core import (finance_forecaster: numpy plus the engine) must stay
+under IMPORT_BUDGET_SECONDS in a fresh interpreter; --check-import-budget
+measures it and exits non-zero when the budget is exceeded.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_SECONDS = 0.5
+# Modules the core import must not pull in
+HEAVY_MODULES = ('streamlit', 'matplotlib', 'pandas')
+# The core modules sit next to this script, wherever it is run from
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import_time(module='finance_forecaster', runs=3):
+    """Best-of-runs cold import time of module in a fresh interpreter, plus any heavy modules it loaded.
+
+    Raises ImportError when the module fails to import.
+    """
+    code = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(elapsed, ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    timings = []
+    heavy = ''
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=SCRIPT_DIR)
+        if process.returncode:
+            error = process.stderr.strip().splitlines()
+            raise ImportError(error[-1] if error else f"import {module} exited with {process.returncode}")
+        output = process.stdout.split()
+        timings.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ''
+    return min(timings), [name for name in heavy.split(',') if name]
+
+
+def check_import_budget():
+    try:
+        elapsed, heavy = measure_import_time()
+    except ImportError as e:
+        print(f"FAIL: import finance_forecaster failed: {e}")
+        return 1
+    print(f"import finance_forecaster: {elapsed * 1000:.0f} ms (budget {IMPORT_BUDGET_SECONDS * 1000:.0f} ms)")
+    if heavy:
+        print(f"FAIL: core import loaded {', '.join(heavy)}")
+        return 1
+    if elapsed > IMPORT_BUDGET_SECONDS:
+        print("FAIL: over budget")
+        return 1
+    print("OK")
+    return 0
+
+
+def print_table(rows, out):
+    out.write(f"{'Date':<12}{'Day':<11}{'Daily Change':>14}{'Balance':>14}  Transactions\n")
+    for row in rows:
+        out.write(f"{row['Date'].isoformat():<12}{row['Day']:<11}"
+                  f"{row['Daily Change']:>+14,.2f}{row['Balance']:>14,.2f}  {row['Transactions']}\n")
+
+
+def write_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(['Date', 'Day', 'Transactions', 'Daily Change', 'Balance'])
+    for row in rows:
+        writer.writerow([row['Date'].isoformat(), row['Day'], row['Transactions'],
+                         f"{row['Daily Change']:.2f}", f"{row['Balance']:.2f}"])
+
+
+def write_json(rows, out):
+    for row in rows:
+        out.write(json.dumps(dict(row, Date=row['Date'].isoformat())) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print or export a cash flow forecast")
+    parser.add_argument('--days', type=int, default=30, help="forecast horizon in days")
+    parser.add_argument('--start', help="as-of date (YYYY-MM-DD), default today")
+    parser.add_argument('--balance', type=float, help="starting balance (default: saved balance)")
+    parser.add_argument('--daily-expenses', type=float, help="daily expenses (default: 100)")
+    parser.add_argument('--balance-file', help="balance file (default: finance_balance.json)")
+    parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table')
+    parser.add_argument('--output', default='-', help="output file (default: stdout)")
+    parser.add_argument('--chart', help="also save the cash flow chart to this image file")
+    parser.add_argument('--check-import-budget', action='store_true',
+                        help="measure the core import time against the budget and exit")
+    args = parser.parse_args(argv)
+
+    if args.check_import_budget:
+        return check_import_budget()
+
+    from finance_forecaster import PersonalFinanceForecaster
+
+    forecaster = PersonalFinanceForecaster(balance_file=args.balance_file)
+    for message in forecaster.pop_errors():
+        print(message, file=sys.stderr)
+    if args.balance is not None:
+        forecaster.current_balance = args.balance
+    if args.daily_expenses is not None:
+        forecaster.daily_expenses = args.daily_expenses
+    start_date = datetime.date.fromisoformat(args.start) if args.start else None
+
+    result = forecaster.compute_forecast(args.days, start_date)
+    rows = result.rows()
+    writer = {'table': print_table, 'csv': write_csv, 'json': write_json}[args.format]
+    if args.output == '-':
+        writer(rows, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as out:
+            writer(rows, out)
+
+    if args.chart:
+        import matplotlib
+        matplotlib.use('Agg')
+        fig, _, _ = forecaster.create_cash_flow_plot(args.days, result)
+        fig.savefig(args.chart)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
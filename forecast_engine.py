@@ -0,0 +1,517 @@
+"""Vectorized cash-flow forecast engine (numpy only, no streamlit)"""
+import datetime
+
+import numpy as np
+
+from balance_queries import RangeMinimum, ThresholdIndex, period_bounds
+from recurrence import EPOCH_ORDINAL, RecurrenceRule
+
+PAY_ANCHOR = datetime.date(2025, 6, 13)
+SOCIAL_SECURITY_START = datetime.date(2025, 6, 1)
+
+# Longest horizons shown day by day, then week by week; longer ones roll up by month
+DAILY_MAX_DAYS = 90
+WEEKLY_MAX_DAYS = 730
+ROLLUP_FREQUENCIES = ('week', 'month')
+
+
+def date_to_day(d):
+    """Convert a date to days since 1970-01-01"""
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day):
+    """Convert days since 1970-01-01 back to a date"""
+    return datetime.date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def household_rules(monthly_expenses, bi_weekly_pay, social_security,
+                    pay_anchor=PAY_ANCHOR, social_security_start=SOCIAL_SECURITY_START):
+    """Express pay, Social Security and the monthly bills as recurrence rules.
+
+    Rule order is pay, Social Security, then bills by day and position,
+    which is the order the forecast applies same-day transactions in.
+    Legacy day-of-month bills are not clamped: a bill on the 30th is
+    skipped in February, as it always has been.
+    """
+    rules = [
+        RecurrenceRule.every("Bi-weekly pay", bi_weekly_pay, pay_anchor, weeks=2, category='pay'),
+        # 4th Wednesday of the month
+        RecurrenceRule.nth_weekday("Social Security", social_security, 4, 2,
+                                   start=social_security_start, category='social_security'),
+    ]
+    for day in sorted(monthly_expenses):
+        for desc, amount in monthly_expenses[day]:
+            rules.append(RecurrenceRule.monthly(desc, -amount, day, clamp=False))
+    return rules
+
+
+def build_daily_cash_flow(start_date, num_days, daily_expenses, schedule):
+    """Build per-day cash-flow arrays for the horizon in one pass.
+
+    schedule is a CompiledSchedule. Returns a dict of arrays of length
+    num_days (day, day_of_month, weekday, is_payday, is_ss, bill_total,
+    daily_change) plus the sorted occurrence arrays occ_offset/occ_rule.
+    """
+    first = date_to_day(start_date)
+    day = np.arange(first, first + num_days, dtype=np.int64)
+    as_dates = day.astype('datetime64[D]')
+    day_of_month = (as_dates - as_dates.astype('datetime64[M]')).astype(np.int64) + 1
+    weekday = (day + 3) % 7
+
+    occ_offset, occ_rule = schedule.occurrences(start_date, num_days)
+    amounts = schedule.amounts[occ_rule]
+    category = schedule.categories[occ_rule]
+
+    is_payday = np.zeros(num_days, dtype=bool)
+    is_payday[occ_offset[category == 'pay']] = True
+    is_ss = np.zeros(num_days, dtype=bool)
+    is_ss[occ_offset[category == 'social_security']] = True
+
+    # Unbuffered, in occurrence order: same-day events apply in rule order,
+    # matching the original per-day loop to the last bit
+    daily_change = np.full(num_days, -float(daily_expenses))
+    np.add.at(daily_change, occ_offset, amounts)
+    outflow = amounts < 0
+    bill_total = np.zeros(num_days)
+    np.add.at(bill_total, occ_offset[outflow], -amounts[outflow])
+
+    return {
+        'day': day,
+        'day_of_month': day_of_month,
+        'weekday': weekday,
+        'is_payday': is_payday,
+        'is_ss': is_ss,
+        'bill_total': bill_total,
+        'daily_change': daily_change,
+        'occ_offset': occ_offset,
+        'occ_rule': occ_rule,
+    }
+
+
+def running_balances(current_balance, daily_change):
+    """Opening balance followed by the balance after each day (single cumulative sum)"""
+    flows = np.empty(len(daily_change) + 1)
+    flows[0] = current_balance
+    flows[1:] = daily_change
+    return np.cumsum(flows)
+
+
+def transaction_labels(daily_expenses, schedule):
+    """Return a memoized labeller for a day's tuple of rule indices"""
+    labels = {}
+    daily = f"Daily expenses: -${daily_expenses:.2f}"
+
+    def label(rule_ids):
+        text = labels.get(rule_ids)
+        if text is None:
+            text = labels[rule_ids] = '; '.join([daily] + [schedule.labels[i] for i in rule_ids])
+        return text
+
+    return label
+
+
+def granularity_for(num_days):
+    """'day', 'week' or 'month': the natural table/chart granularity for a horizon"""
+    if num_days <= DAILY_MAX_DAYS:
+        return 'day'
+    if num_days <= WEEKLY_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def weekday_names():
+    """Locale-aware weekday names indexed by date.weekday()"""
+    monday = datetime.date(2024, 1, 1)
+    return [(monday + datetime.timedelta(days=i)).strftime('%A') for i in range(7)]
+
+
+class EventCalendar:
+    """Scheduled events for every day of a horizon, indexed by day offset.
+
+    bounds[i]:bounds[i + 1] slices the occurrence arrays for day i, so a
+    day's events are found in constant time; dates map to offsets by
+    ordinal arithmetic, and by_date() indexes the event days in a dict.
+    """
+
+    def __init__(self, start_date, num_days, occ_offset, occ_rule, schedule):
+        self.start_date = start_date
+        self.num_days = num_days
+        self.occ_offset = occ_offset
+        self.occ_rule = occ_rule
+        self.schedule = schedule
+        self.bounds = np.searchsorted(occ_offset, np.arange(num_days + 1))
+        self._rule_lists = None
+        self._by_date = None
+
+    def offset_of(self, d):
+        """Day offset of a date, or None if it falls outside the horizon"""
+        offset = d.toordinal() - self.start_date.toordinal()
+        return offset if 0 <= offset < self.num_days else None
+
+    def rule_ids(self, offset):
+        """Tuple of rule indices occurring on the given day offset"""
+        if self._rule_lists is None:
+            bounds = self.bounds.tolist()
+            occ_rule = self.occ_rule.tolist()
+            self._rule_lists = [tuple(occ_rule[bounds[i]:bounds[i + 1]]) for i in range(self.num_days)]
+        return self._rule_lists[offset]
+
+    def events_at(self, offset):
+        """(name, amount, category) for each event on a day offset"""
+        rules = self.schedule.rules
+        return [(rules[i].name, rules[i].amount, rules[i].category) for i in self.rule_ids(offset)]
+
+    def events_on(self, d):
+        """(name, amount, category) for each event on a date"""
+        offset = self.offset_of(d)
+        return [] if offset is None else self.events_at(offset)
+
+    def by_date(self):
+        """Dict of date -> day offset for every day that has events"""
+        if self._by_date is None:
+            offsets = np.unique(self.occ_offset).tolist()
+            self._by_date = {self.start_date + datetime.timedelta(days=o): o for o in offsets}
+        return self._by_date
+
+    def offsets(self, category):
+        """Sorted day offsets with at least one event of the category"""
+        hits = self.schedule.categories[self.occ_rule] == category
+        return np.unique(self.occ_offset[hits])
+
+    def head(self, num_days):
+        if num_days >= self.num_days:
+            return self
+        end = self.bounds[num_days]
+        return EventCalendar(self.start_date, num_days, self.occ_offset[:end],
+                             self.occ_rule[:end], self.schedule)
+
+
+class ForecastResult:
+    """Columnar forecast computed once and shared by the table, metrics and chart.
+
+    Per-day columns hold one entry per forecast day (start_date onwards);
+    chart_dates/chart_balances prepend the opening point the chart draws.
+    calendar is the EventCalendar of scheduled transactions (it may be
+    passed as a zero-argument callable and is then built on first use).
+
+    The with_* methods derive a new result from this one for a changed
+    input without re-running the engine; unchanged columns are shared.
+    """
+
+    def __init__(self, start_date, opening_balance, daily_change, balance, is_payday, is_ss,
+                 bill_total, day_of_month, weekday, calendar, label):
+        self.start_date = start_date
+        self.opening_balance = opening_balance
+        self.daily_change = daily_change
+        self.balance = balance
+        self.is_payday = is_payday
+        self.is_ss = is_ss
+        self.bill_total = bill_total
+        self.day_of_month = day_of_month
+        self.weekday = weekday
+        self._calendar = calendar
+        self._label = label
+        self._dates = None
+        self._rollups = {}
+        self._range_minimum = None
+        self._threshold_index = None
+
+    @property
+    def calendar(self):
+        if callable(self._calendar):
+            self._calendar = self._calendar()
+        return self._calendar
+
+    @property
+    def num_days(self):
+        return len(self.daily_change)
+
+    @property
+    def dates(self):
+        if self._dates is None:
+            self._dates = [self.start_date + datetime.timedelta(days=i) for i in range(self.num_days)]
+        return self._dates
+
+    @property
+    def chart_dates(self):
+        return [self.start_date] + self.dates
+
+    @property
+    def chart_balances(self):
+        return [self.opening_balance] + self.balance.tolist()
+
+    @property
+    def pay_dates(self):
+        return [self.dates[i] for i in np.flatnonzero(self.is_payday)]
+
+    @property
+    def ss_dates(self):
+        return [self.dates[i] for i in np.flatnonzero(self.is_ss)]
+
+    @property
+    def final_balance(self):
+        return float(self.balance[-1]) if self.num_days else self.opening_balance
+
+    @property
+    def min_balance(self):
+        return float(self.balance.min()) if self.num_days else self.opening_balance
+
+    @property
+    def days_negative(self):
+        return int(np.count_nonzero(self.balance < 0))
+
+    def major_expense_mask(self, threshold=300):
+        """Days whose monthly bills add up to more than threshold"""
+        return self.bill_total > threshold
+
+    def head(self, num_days):
+        """The first num_days of this forecast (same as forecasting num_days directly)"""
+        if num_days >= self.num_days:
+            return self
+        return ForecastResult(
+            self.start_date, self.opening_balance,
+            self.daily_change[:num_days], self.balance[:num_days],
+            self.is_payday[:num_days], self.is_ss[:num_days], self.bill_total[:num_days],
+            self.day_of_month[:num_days], self.weekday[:num_days],
+            self.calendar.head(num_days), self._label
+        )
+
+    def _replace(self, **changes):
+        fields = {
+            'start_date': self.start_date,
+            'opening_balance': self.opening_balance,
+            'daily_change': self.daily_change,
+            'balance': self.balance,
+            'is_payday': self.is_payday,
+            'is_ss': self.is_ss,
+            'bill_total': self.bill_total,
+            'day_of_month': self.day_of_month,
+            'weekday': self.weekday,
+            'calendar': self._calendar,
+            'label': self._label,
+        }
+        fields.update(changes)
+        result = ForecastResult(**fields)
+        if 'start_date' not in changes:
+            result._dates = self._dates
+        return result
+
+    def with_opening_balance(self, opening_balance):
+        """Forecast for a different starting balance: every balance shifts by the same amount"""
+        delta = opening_balance - self.opening_balance
+        return self._replace(opening_balance=opening_balance, balance=self.balance + delta)
+
+    def with_daily_expense_delta(self, delta, label):
+        """Forecast with daily expenses raised by delta: balances lose a linear ramp"""
+        ramp = delta * np.arange(1, self.num_days + 1)
+        return self._replace(daily_change=self.daily_change - delta, balance=self.balance - ramp,
+                             label=label)
+
+    def with_rule_delta(self, offsets, amount, calendar, label, is_bill=True):
+        """Forecast with a cash flow of amount added on the given day offsets.
+
+        Only the affected days of daily_change and bill_total are written;
+        balances take one cumulative sum from the first affected day on.
+        Bills are negative, so removing a bill passes its negated amount.
+        """
+        daily_change = self.daily_change.copy()
+        balance = self.balance.copy()
+        bill_total = self.bill_total
+        if len(offsets):
+            np.add.at(daily_change, offsets, amount)
+            first = int(offsets.min())
+            step = np.zeros(self.num_days - first)
+            np.add.at(step, offsets - first, amount)
+            balance[first:] += np.cumsum(step)
+            if is_bill:
+                bill_total = bill_total.copy()
+                np.add.at(bill_total, offsets, -amount)
+        return self._replace(daily_change=daily_change, balance=balance, bill_total=bill_total,
+                             calendar=calendar, label=label)
+
+    def max_difference(self, other):
+        """Largest absolute difference in daily change or balance against another result"""
+        if self.num_days != other.num_days:
+            return float('inf')
+        diffs = [abs(self.opening_balance - other.opening_balance)]
+        if self.num_days:
+            diffs.append(float(np.abs(self.daily_change - other.daily_change).max()))
+            diffs.append(float(np.abs(self.balance - other.balance).max()))
+            diffs.append(float(np.abs(self.bill_total - other.bill_total).max()))
+        return max(diffs)
+
+    def rows(self):
+        """Per-day rows for the forecast table"""
+        day_names = weekday_names()
+        calendar = self.calendar
+        return [
+            {
+                'Date': current_date,
+                'Day': day_names[weekday],
+                'Transactions': self._label(calendar.rule_ids(i)),
+                'Daily Change': daily_change,
+                'Balance': balance
+            }
+            for i, (current_date, weekday, daily_change, balance) in enumerate(zip(
+                self.dates, self.weekday.tolist(), self.daily_change.tolist(), self.balance.tolist()
+            ))
+        ]
+
+    def to_frame(self, start=0, stop=None):
+        """Rows start:stop as a DataFrame with native date and float columns.
+
+        Only the requested slice is labelled, so a page of a multi-year
+        forecast costs the same as a short forecast.
+        """
+        # pandas is only needed by the table; the engine itself stays numpy only
+        import pandas as pd
+
+        start, stop, _ = slice(start, stop).indices(self.num_days)
+        stop = max(start, stop)
+        day_names = np.array(weekday_names(), dtype=object)
+        calendar = self.calendar
+        return pd.DataFrame({
+            'Date': np.datetime64(self.start_date, 'D') + np.arange(start, stop),
+            'Day': day_names[self.weekday[start:stop]],
+            'Transactions': [self._label(calendar.rule_ids(i)) for i in range(start, stop)],
+            'Daily Change': self.daily_change[start:stop],
+            'Balance': self.balance[start:stop]
+        })
+
+    @property
+    def range_minimum(self):
+        """RangeMinimum index over the daily balances, built on first use"""
+        if self._range_minimum is None:
+            self._range_minimum = RangeMinimum(self.balance)
+        return self._range_minimum
+
+    def lowest_between(self, first_date, last_date):
+        """(date, balance) of the lowest balance from first_date to last_date inclusive.
+
+        The range is clipped to the horizon; returns None when it misses it.
+        """
+        lo = max(0, first_date.toordinal() - self.start_date.toordinal())
+        hi = min(self.num_days - 1, last_date.toordinal() - self.start_date.toordinal())
+        if lo > hi:
+            return None
+        low = self.range_minimum.argmin(lo, hi)
+        return self.start_date + datetime.timedelta(days=low), float(self.balance[low])
+
+    def pay_period_floors(self):
+        """Lowest balance of each pay period (payday to the day before the next).
+
+        Returns (starts, ends, low_offsets, low_balances) arrays of day
+        offsets; days before the first payday form the first period.
+        """
+        starts, ends = period_bounds(self.is_payday)
+        lows = self.range_minimum.argmin_many(starts, ends)
+        return starts, ends, lows, self.balance[lows]
+
+    @property
+    def threshold_index(self):
+        """ThresholdIndex (prefix minima) over the daily balances, built on first use"""
+        if self._threshold_index is None:
+            self._threshold_index = ThresholdIndex(self.balance)
+        return self._threshold_index
+
+    def runway_days(self, floor=0.0):
+        """Days before the balance first drops below floor (num_days if it never does).
+
+        floor may be an array of floors; the answer is then an array too.
+        """
+        return self.threshold_index.first_below(floor)
+
+    def first_date_below(self, floor=0.0):
+        """First date the balance drops below floor, or None within the horizon"""
+        first = self.threshold_index.first_below(floor)
+        return self.start_date + datetime.timedelta(days=first) if first < self.num_days else None
+
+    def intervals_below(self, floor=0.0):
+        """(first_date, last_date) of each stretch of days spent below floor"""
+        starts, ends = self.threshold_index.intervals_below(floor)
+        return [
+            (self.start_date + datetime.timedelta(days=start), self.start_date + datetime.timedelta(days=end))
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
+
+    def rollup(self, freq):
+        """Weekly (Monday-start) or monthly ForecastRollup of the daily columns.
+
+        Periods are cut where a week or month begins; the first and last
+        periods may be partial. Each column is one reduceat over the daily
+        arrays, and the rollup is kept for reuse.
+        """
+        if freq not in ROLLUP_FREQUENCIES:
+            raise ValueError(f"Unknown rollup frequency: {freq}")
+        rollup = self._rollups.get(freq)
+        if rollup is not None:
+            return rollup
+        starts, ends = period_bounds(self.weekday == 0 if freq == 'week' else self.day_of_month == 1)
+        ends += 1
+        if len(starts):
+            net_flow = np.add.reduceat(self.daily_change, starts)
+            bill_total = np.add.reduceat(self.bill_total, starts)
+            min_balance = np.minimum.reduceat(self.balance, starts)
+            max_balance = np.maximum.reduceat(self.balance, starts)
+            ending_balance = self.balance[ends - 1]
+        else:
+            ends = net_flow = bill_total = min_balance = max_balance = ending_balance = np.empty(0)
+        rollup = self._rollups[freq] = ForecastRollup(
+            freq, np.datetime64(self.start_date, 'D') + starts, ends - starts, net_flow, bill_total,
+            min_balance, max_balance, ending_balance
+        )
+        return rollup
+
+
+class ForecastRollup:
+    """Per-week or per-month aggregates of a forecast, one entry per period"""
+
+    def __init__(self, freq, period_start, days, net_flow, bill_total, min_balance, max_balance,
+                 ending_balance):
+        self.freq = freq
+        self.period_start = period_start
+        self.days = days
+        self.net_flow = net_flow
+        self.bill_total = bill_total
+        self.min_balance = min_balance
+        self.max_balance = max_balance
+        self.ending_balance = ending_balance
+
+    @property
+    def num_periods(self):
+        return len(self.period_start)
+
+    def to_frame(self, start=0, stop=None):
+        """Periods start:stop as a DataFrame with native date and float columns"""
+        import pandas as pd
+
+        window = slice(start, stop)
+        return pd.DataFrame({
+            'Week Of' if self.freq == 'week' else 'Month': self.period_start[window],
+            'Days': self.days[window],
+            'Net Flow': self.net_flow[window],
+            'Bills': self.bill_total[window],
+            'Min Balance': self.min_balance[window],
+            'Max Balance': self.max_balance[window],
+            'Ending Balance': self.ending_balance[window]
+        })
+
+
+def build_calendar(start_date, num_days, schedule):
+    """EventCalendar of a compiled schedule over the horizon"""
+    occ_offset, occ_rule = schedule.occurrences(start_date, num_days)
+    return EventCalendar(start_date, num_days, occ_offset, occ_rule, schedule)
+
+
+def forecast(start_date, num_days, current_balance, daily_expenses, schedule):
+    """Run the engine over the horizon and wrap the columns in a ForecastResult"""
+    flow = build_daily_cash_flow(start_date, num_days, daily_expenses, schedule)
+    balance = running_balances(current_balance, flow['daily_change'])[1:]
+    return ForecastResult(
+        start_date, current_balance, flow['daily_change'], balance,
+        flow['is_payday'], flow['is_ss'], flow['bill_total'],
+        flow['day_of_month'], flow['weekday'],
+        EventCalendar(start_date, num_days, flow['occ_offset'], flow['occ_rule'], schedule),
+        transaction_labels(daily_expenses, schedule)
+    )
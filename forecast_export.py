@@ -0,0 +1,241 @@
+"""Export forecast results as Parquet, Arrow IPC or CSV.
+
+    python forecast_export.py --days 3650 --table daily -o forecast.parquet
+    python forecast_export.py --days 365 --table events --format csv -o events.csv
+
+Tables are written straight from the engine's column arrays in batches of
+BATCH_ROWS rows; no per-row dicts or DataFrames are built. The tables are:
+- daily: one row per forecast day
+- week and month: rollups
+- events: one row per scheduled occurrence, with name and category
+  dictionary-encoded by rule
+
+Arrow output uses the uncompressed IPC file format, so downstream tools
+can memory-map it with no copies:
+
+    with pyarrow.memory_map('forecast.arrow') as source:
+        table = pyarrow.ipc.open_file(source).read_all()
+
+Parquet and Arrow need pyarrow; CSV uses only the standard library.
+"""
+import argparse
+import csv
+import io
+import sys
+
+import numpy as np
+
+FORMATS = ('parquet', 'arrow', 'csv')
+TABLES = ('daily', 'week', 'month', 'events')
+MIME_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+    'csv': 'text/csv',
+}
+BATCH_ROWS = 65_536
+
+# Column names and types per table. Dates are int32 days since 1970-01-01
+# and dictionary columns are int32 indices into dictionaries()
+TABLE_COLUMNS = {
+    'daily': [('date', 'date'), ('weekday', 'int8'), ('daily_change', 'float64'), ('balance', 'float64'),
+              ('bills', 'float64'), ('payday', 'bool'), ('social_security', 'bool'), ('events', 'int32')],
+    'events': [('date', 'date'), ('name', 'dictionary'), ('category', 'dictionary'), ('amount', 'float64')],
+    'rollup': [('period_start', 'date'), ('days', 'int32'), ('net_flow', 'float64'), ('bills', 'float64'),
+               ('min_balance', 'float64'), ('max_balance', 'float64'), ('ending_balance', 'float64')],
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow export need pyarrow (pip install pyarrow); "
+                          "CSV export works without it") from None
+    return pyarrow
+
+
+def _day_offsets(result, offsets):
+    """Days since 1970-01-01 for day offsets into the forecast, as int32 for date32"""
+    return (np.datetime64(result.start_date, 'D') + offsets).astype(np.int64).astype(np.int32)
+
+
+def batches(result, table='daily', batch_rows=BATCH_ROWS):
+    """Yield dicts of column arrays (slices of the result's arrays) for a table.
+
+    Dates are int32 days since 1970-01-01. Events carry 'name' and
+    'category' as indices into the lists returned by dictionaries().
+    """
+    columns(table)  # rejects unknown tables before the first batch is asked for
+    if table == 'daily':
+        calendar = result.calendar
+        events = np.diff(calendar.bounds)
+        for start in range(0, result.num_days, batch_rows):
+            stop = min(start + batch_rows, result.num_days)
+            yield {
+                'date': _day_offsets(result, np.arange(start, stop)),
+                # 0 = Monday, as date.weekday()
+                'weekday': result.weekday[start:stop].astype(np.int8),
+                'daily_change': result.daily_change[start:stop],
+                'balance': result.balance[start:stop],
+                'bills': result.bill_total[start:stop],
+                'payday': result.is_payday[start:stop],
+                'social_security': result.is_ss[start:stop],
+                'events': events[start:stop].astype(np.int32),
+            }
+    elif table == 'events':
+        calendar = result.calendar
+        _, category_ids = _categories(calendar.schedule)
+        for start in range(0, len(calendar.occ_offset), batch_rows):
+            stop = min(start + batch_rows, len(calendar.occ_offset))
+            rule = calendar.occ_rule[start:stop]
+            yield {
+                'date': _day_offsets(result, calendar.occ_offset[start:stop]),
+                'name': rule.astype(np.int32),
+                'category': category_ids[rule],
+                'amount': calendar.schedule.amounts[rule],
+            }
+    else:
+        rollup = result.rollup(table)
+        for start in range(0, rollup.num_periods, batch_rows):
+            window = slice(start, start + batch_rows)
+            yield {
+                'period_start': rollup.period_start[window].astype(np.int64).astype(np.int32),
+                'days': rollup.days[window].astype(np.int32),
+                'net_flow': rollup.net_flow[window],
+                'bills': rollup.bill_total[window],
+                'min_balance': rollup.min_balance[window],
+                'max_balance': rollup.max_balance[window],
+                'ending_balance': rollup.ending_balance[window],
+            }
+
+
+def _categories(schedule):
+    """(category names, int32 category index per rule)"""
+    names, ids = np.unique(schedule.categories.astype(str), return_inverse=True)
+    return names.tolist(), ids.astype(np.int32)
+
+
+def dictionaries(result):
+    """Value lists for the events table's dictionary-encoded columns"""
+    schedule = result.calendar.schedule
+    return {'name': [rule.name for rule in schedule.rules], 'category': _categories(schedule)[0]}
+
+
+def columns(table):
+    """(name, type) of each column of a table"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown export table: {table}")
+    return TABLE_COLUMNS['rollup' if table in ('week', 'month') else table]
+
+
+def _schema(pa, table):
+    types = {'date': pa.date32(), 'dictionary': pa.dictionary(pa.int32(), pa.string()), 'bool': pa.bool_()}
+    return pa.schema([(name, types[kind] if kind in types else pa.type_for_alias(kind))
+                      for name, kind in columns(table)])
+
+
+def record_batches(result, table='daily', batch_rows=BATCH_ROWS):
+    """Yield pyarrow RecordBatches of a table (numeric columns wrap the numpy buffers)"""
+    pa = _require_pyarrow()
+    schema = _schema(pa, table)
+    values = {}
+    if table == 'events':
+        values = {name: pa.array(words, type=pa.string()) for name, words in dictionaries(result).items()}
+    kinds = dict(columns(table))
+    for batch in batches(result, table, batch_rows):
+        arrays = []
+        for field in schema:
+            column = batch[field.name]
+            if kinds[field.name] == 'dictionary':
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(column), values[field.name]))
+            elif kinds[field.name] == 'date':
+                arrays.append(pa.array(column).view(pa.date32()))
+            else:
+                arrays.append(pa.array(column, type=field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_csv(result, table, sink, batch_rows):
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    kinds = columns(table)
+    writer.writerow([name for name, _ in kinds])
+    values = {}
+    if table == 'events':
+        values = {name: np.array(words, dtype=object) for name, words in dictionaries(result).items()}
+    rows = 0
+    for batch in batches(result, table, batch_rows):
+        text_columns = []
+        for name, kind in kinds:
+            column = batch[name]
+            if kind == 'date':
+                text_columns.append(column.astype('M8[D]').astype(str).tolist())
+            elif kind == 'dictionary':
+                text_columns.append(values[name][column].tolist())
+            elif kind == 'float64':
+                text_columns.append(np.round(column, 2).tolist())
+            else:
+                text_columns.append(column.tolist())
+        writer.writerows(zip(*text_columns))
+        rows += len(text_columns[0])
+    text.detach()
+    return rows
+
+
+def write(result, sink, fmt='parquet', table='daily', batch_rows=BATCH_ROWS):
+    """Stream a table to a path or binary file object; returns the rows written"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'csv':
+        if isinstance(sink, str):
+            with open(sink, 'wb') as f:
+                return _write_csv(result, table, f, batch_rows)
+        return _write_csv(result, table, sink, batch_rows)
+
+    pa = _require_pyarrow()
+    schema = _schema(pa, table)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+    rows = 0
+    try:
+        for batch in record_batches(result, table, batch_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+def to_bytes(result, fmt='parquet', table='daily'):
+    """A whole export in memory, for download buttons"""
+    buffer = io.BytesIO()
+    write(result, buffer, fmt, table)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    from finance_forecaster import PersonalFinanceForecaster
+
+    parser = argparse.ArgumentParser(description="Export a forecast as Parquet, Arrow IPC or CSV")
+    parser.add_argument('-o', '--output', required=True, help="output file")
+    parser.add_argument('--days', type=int, default=365, help="forecast horizon in days (default: 365)")
+    parser.add_argument('--table', choices=TABLES, default='daily')
+    parser.add_argument('--format', choices=FORMATS, help="default: from the output file's extension")
+    parser.add_argument('--balance-file', help="balance file (default: finance_balance.json)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or next((fmt for fmt in FORMATS if args.output.endswith('.' + fmt)), None)
+    if fmt is None:
+        parser.error("Cannot tell the format from the output name; pass --format")
+    forecaster = PersonalFinanceForecaster(args.balance_file)
+    result = forecaster.compute_forecast(args.days)
+    rows = write(result, args.output, fmt, args.table)
+    print(f"{rows} {args.table} rows written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
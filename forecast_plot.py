@@ -0,0 +1,152 @@
+"""Matplotlib rendering of a ForecastResult; imported lazily by the forecaster"""
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import numpy as np
+
+import forecast_engine
+
+# Longest series drawn point for point; longer ones are downsampled
+MAX_LINE_POINTS = 1000
+# Most bars drawn in the cash flow plot; more periods are drawn as lines
+MAX_BARS = 120
+# Horizons up to this many days keep per-point markers and large event markers
+DETAIL_DAYS = 90
+
+FLOW_TITLES = {
+    'day': 'Daily Cash Flow Changes',
+    'week': 'Weekly Net Cash Flow',
+    'month': 'Monthly Net Cash Flow',
+}
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices to keep.
+
+    Keeps the first and last points and, per bucket, the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    mean, which preserves peaks and troughs of the series.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        next_lo, next_hi = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n
+        next_hi = max(next_hi, next_lo + 1)
+        mean_x = x[next_lo:next_hi].mean()
+        mean_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[previous] - mean_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (mean_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        keep[b + 1] = previous
+    return keep
+
+
+def create_cash_flow_figure(result):
+    """Create matplotlib figure for cash flow; returns (fig, min_balance, days_negative)"""
+    num_days = result.num_days
+    start = np.datetime64(result.start_date, 'D')
+    day_dates = start + np.arange(num_days)
+    # Chart point 0 is the opening balance; day offset i is chart point i + 1
+    dates = np.concatenate([[start], day_dates])
+    balances = np.concatenate([[result.opening_balance], result.balance])
+    daily_changes = result.daily_change
+    calendar = result.calendar
+    detailed = num_days <= DETAIL_DAYS
+
+    # Create the plot
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    fig.suptitle('Personal Finance Cash Flow Forecast', fontsize=16, fontweight='bold')
+
+    # Top plot: Running Balance, downsampled for long horizons
+    keep = lttb(np.arange(len(balances)), balances, MAX_LINE_POINTS)
+    ax1.plot(dates[keep], balances[keep], linewidth=3 if detailed else 1.5, color='darkblue',
+             marker='o' if detailed else None, markersize=4)
+
+    # Color negative balance areas red: one step-filled region covering each
+    # negative day back to the previous point
+    negative = balances < 0
+    negative[0] = False
+    if negative.any():
+        ax1.fill_between(dates, 0, 1, where=negative, step='pre', alpha=0.3, color='red',
+                         linewidth=0, transform=ax1.get_xaxis_transform())
+
+    # Add horizontal line at zero
+    ax1.axhline(y=0, color='red', linestyle='--', alpha=0.7, linewidth=2)
+
+    # Mark special days, one scatter call per marker type
+    markers = [
+        (calendar.offsets('pay'), 'green', '^', 'Payday'),
+        (calendar.offsets('social_security'), 'blue', 's', 'Social Security'),
+        (np.flatnonzero(result.major_expense_mask()), 'orange', 'v', 'Major Expenses')
+    ]
+    for offsets, color, marker, label in markers:
+        if len(offsets):
+            ax1.scatter(day_dates[offsets], result.balance[offsets], color=color,
+                        s=100 if detailed else 25, marker=marker, label=label, zorder=5)
+
+    ax1.set_title('Cash Balance Over Time', fontsize=14)
+    ax1.set_ylabel('Balance ($)', fontsize=12)
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+    ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+
+    # Bottom plot: daily changes, or weekly/monthly net flow for long horizons
+    granularity = forecast_engine.granularity_for(num_days)
+    if granularity == 'day':
+        flow_dates, flows, widths = day_dates, daily_changes, 0.8
+    else:
+        rollup = result.rollup(granularity)
+        flow_dates, flows = rollup.period_start, rollup.net_flow
+        widths = rollup.days * 0.8
+    colors = np.where(flows >= 0, 'green', 'red')
+    if len(flows) <= MAX_BARS:
+        ax2.bar(flow_dates, flows, width=widths, align='edge' if granularity != 'day' else 'center',
+                color=colors, alpha=0.7)
+    else:
+        ax2.vlines(flow_dates, 0, flows, colors=colors, alpha=0.7)
+    ax2.axhline(y=0, color='black', linestyle='-', alpha=0.5, linewidth=1)
+
+    ax2.set_title(FLOW_TITLES[granularity], fontsize=14)
+    ax2.set_ylabel('Daily Change ($)' if granularity == 'day' else 'Net Flow ($)', fontsize=12)
+    ax2.set_xlabel('Date', fontsize=12)
+    ax2.grid(True, alpha=0.3)
+    ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+
+    # Format x-axis dates: every other day for short horizons, otherwise
+    # let matplotlib pick ticks that suit the span
+    for ax in [ax1, ax2]:
+        if detailed:
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
+            ax.xaxis.set_major_locator(mdates.DayLocator(interval=2))
+            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
+        else:
+            locator = mdates.AutoDateLocator(minticks=5, maxticks=12)
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    # Add statistics
+    min_balance = float(balances.min())
+    max_balance = float(balances.max())
+    final_balance = float(balances[-1])
+    days_negative = int(np.count_nonzero(balances < 0))
+
+    stats_text = f'''Statistics:
+Starting: ${balances[0]:,.0f}
+Ending: ${final_balance:,.0f}
+Minimum: ${min_balance:,.0f}
+Maximum: ${max_balance:,.0f}
+Days Negative: {days_negative}'''
+
+    ax1.text(0.02, 0.98, stats_text, transform=ax1.transAxes,
+            verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+
+    plt.tight_layout()
+    return fig, min_balance, days_negative
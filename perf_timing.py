@@ -0,0 +1,123 @@
+"""Lightweight per-stage timing spans with rolling p50/p95 stats.
+
+    with perf_timing.span('forecast'):
+        ...
+
+Spans are off unless enabled (or FORECAST_TIMING=1 is set in the
+environment); a disabled span is a shared no-op context manager, so
+instrumented code pays one function call and a flag check. Enabled
+spans keep the last WINDOW durations per stage for the rolling stats and
+can be exported as JSON lines.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Durations kept per stage for the rolling percentiles
+WINDOW = 200
+
+_enabled = os.environ.get('FORECAST_TIMING', '') not in ('', '0')
+_samples = {}
+_lock = threading.Lock()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def span(stage):
+    """Context manager timing one run of stage (a no-op while timing is off)"""
+    return _Span(stage) if _enabled else _NULL_SPAN
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def disable():
+    enable(False)
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(stage, seconds):
+    """Record a duration measured elsewhere"""
+    sample = (time.time(), seconds)
+    with _lock:
+        samples = _samples.get(stage)
+        if samples is None:
+            samples = _samples[stage] = deque(maxlen=WINDOW)
+        samples.append(sample)
+
+
+def _percentile(ordered, q):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def stats():
+    """Per-stage rolling stats in milliseconds: count, last, p50, p95, max"""
+    with _lock:
+        snapshot = {stage: [seconds for _, seconds in samples] for stage, samples in _samples.items()}
+    summary = {}
+    for stage, durations in sorted(snapshot.items()):
+        ordered = sorted(durations)
+        summary[stage] = {
+            'count': len(durations),
+            'last_ms': durations[-1] * 1000,
+            'p50_ms': _percentile(ordered, 50) * 1000,
+            'p95_ms': _percentile(ordered, 95) * 1000,
+            'max_ms': ordered[-1] * 1000,
+        }
+    return summary
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def to_jsonl():
+    """The recorded spans as JSON lines, oldest first"""
+    with _lock:
+        events = [(at, stage, seconds) for stage, samples in _samples.items() for at, seconds in samples]
+    events.sort()
+    return ''.join(
+        json.dumps({'time': round(at, 6), 'stage': stage, 'ms': round(seconds * 1000, 3)}) + '\n'
+        for at, stage, seconds in events
+    )
+
+
+def export_jsonl(path):
+    """Append the recorded spans to a JSON lines file; returns the number written"""
+    lines = to_jsonl()
+    with open(path, 'a') as f:
+        f.write(lines)
+    return lines.count('\n')
@@ -0,0 +1,379 @@
+"""Forecast-vs-actual reconciliation over stored daily forecast snapshots.
+
+    python reconciliation.py --balance-file finance_balance.json
+    python reconciliation.py --lead 7 --first 2025-01-01 --last 2025-12-31
+
+Each day's forecast is kept as a snapshot of its first SNAPSHOT_DAYS days
+(balance plus income, bill and spending flows), and actual balances are
+recorded as they are entered. Both live in raw little-endian column files
+read back with np.memmap, like the transaction store. Snapshots are
+appended in day order, so the snapshot column is sorted. A report
+binary-searches it for the rows that can cover its date range, then scans
+just those rows CHUNK_ROWS at a time. A year of daily snapshots is never
+held in memory at once.
+
+Variance is actual minus forecast, so a negative variance means the
+forecast was too optimistic.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+
+from balance_journal import FileLock, atomic_write_json
+from forecast_engine import date_to_day, day_to_date
+
+STORE_DIR = 'reconciliation'
+# Forecast days kept per snapshot
+SNAPSHOT_DAYS = 90
+CHUNK_ROWS = 100_000
+
+SNAPSHOT_COLUMNS = {
+    'snapshot': np.dtype('<i4'),
+    'day': np.dtype('<i4'),
+    'balance': np.dtype('<f8'),
+    'income': np.dtype('<f8'),
+    'bills': np.dtype('<f8'),
+    'spending': np.dtype('<f8'),
+}
+ACTUAL_COLUMNS = {
+    'day': np.dtype('<i4'),
+    'balance': np.dtype('<f8'),
+}
+CATEGORIES = ('income', 'bills', 'spending')
+
+
+class _ColumnFiles:
+    """One raw column file per field, rows counted by the owner's meta.json"""
+
+    def __init__(self, directory, prefix, columns, rows):
+        self.directory = directory
+        self.prefix = prefix
+        self.columns = columns
+        # A crash while today's snapshot was being rewritten can leave files
+        # shorter than the committed count; read only what every file holds
+        for name, dtype in columns.items():
+            path = self._path(name)
+            size = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+            rows = min(rows, size)
+        self.rows = rows
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{self.prefix}_{name}.bin")
+
+    def column(self, name):
+        dtype = self.columns[name]
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def drop_uncommitted(self):
+        """Cut rows appended after the last commit; only under the store's lock"""
+        for name, dtype in self.columns.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > self.rows * dtype.itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(self.rows * dtype.itemsize)
+
+    def write(self, row, chunk):
+        """Write chunk's rows from row on, overwriting or extending; files never shrink"""
+        for name, dtype in self.columns.items():
+            path = self._path(name)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.seek(row * dtype.itemsize)
+                f.write(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows = max(self.rows, row + len(chunk['day']))
+
+    def append(self, chunk):
+        self.write(self.rows, chunk)
+
+
+class ReconciliationStore:
+    """Daily forecast snapshots and actual balances in a directory.
+
+    Opening a store only reads it. Every write holds store.lock, catches
+    up on what other writers committed and drops their uncommitted rows
+    first.
+    """
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.lock = FileLock(os.path.join(directory, 'store.lock'))
+        self._load_meta()
+
+    def _load_meta(self):
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+        self.snapshots = _ColumnFiles(self.directory, 'snapshot', SNAPSHOT_COLUMNS, meta.get('snapshot_rows', 0))
+        self.actuals = _ColumnFiles(self.directory, 'actual', ACTUAL_COLUMNS, meta.get('actual_rows', 0))
+        # Day and first row of the newest snapshot, which is replaced while that day lasts
+        self.last_snapshot = meta.get('last_snapshot')
+        self.last_snapshot_row = meta.get('last_snapshot_row', 0)
+        # Last balance journal event copied into the actuals
+        self.journal_sequence = meta.get('journal_sequence', 0)
+
+    @contextmanager
+    def _writing(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self._load_meta()
+            self.snapshots.drop_uncommitted()
+            self.actuals.drop_uncommitted()
+            yield
+
+    def _commit(self):
+        atomic_write_json(self.meta_path, {
+            'snapshot_rows': self.snapshots.rows,
+            'actual_rows': self.actuals.rows,
+            'last_snapshot': self.last_snapshot,
+            'last_snapshot_row': self.last_snapshot_row,
+            'journal_sequence': self.journal_sequence,
+            'snapshot_columns': {name: dtype.str for name, dtype in SNAPSHOT_COLUMNS.items()},
+            'actual_columns': {name: dtype.str for name, dtype in ACTUAL_COLUMNS.items()},
+        })
+
+    def record_forecast(self, result, daily_expenses, days=SNAPSHOT_DAYS):
+        """Store the first days of a ForecastResult as the snapshot for its start date.
+
+        A later forecast on the same day rewrites that day's snapshot in
+        place unless it covers fewer days or matches what is stored;
+        forecasts starting before the newest snapshot are ignored.
+        Returns whether the snapshot was written.
+        """
+        snapshot = date_to_day(result.start_date)
+        n = min(days, result.num_days)
+        bills = result.bill_total[:n]
+        spending = np.full(n, float(daily_expenses))
+        chunk = {
+            'snapshot': np.full(n, snapshot),
+            'day': np.arange(snapshot, snapshot + n),
+            'balance': result.balance[:n],
+            # daily_change = income - bills - spending
+            'income': np.round(result.daily_change[:n] + bills + spending, 2),
+            'bills': bills,
+            'spending': spending,
+        }
+        with self._writing():
+            if self.last_snapshot is not None and snapshot < self.last_snapshot:
+                return False
+            if snapshot == self.last_snapshot:
+                stored = self.snapshots.rows - self.last_snapshot_row
+                if n < stored:
+                    return False
+                if n == stored and self._snapshot_matches(chunk):
+                    return False
+            else:
+                self.last_snapshot = snapshot
+                self.last_snapshot_row = self.snapshots.rows
+            self.snapshots.write(self.last_snapshot_row, chunk)
+            self._commit()
+        return True
+
+    def _snapshot_matches(self, chunk):
+        window = slice(self.last_snapshot_row, self.snapshots.rows)
+        return all(np.array_equal(self.snapshots.column(name)[window], np.asarray(values, dtype=dtype))
+                   for (name, values), dtype in zip(chunk.items(), SNAPSHOT_COLUMNS.values()))
+
+    def record_actual(self, date, balance):
+        """Record an actual balance; the last one recorded for a day is its closing balance"""
+        with self._writing():
+            self.actuals.append({'day': np.array([date_to_day(date)]), 'balance': np.array([float(balance)])})
+            self._commit()
+
+    def import_journal(self, events):
+        """Copy balance journal events not seen before into the actuals; returns how many"""
+        with self._writing():
+            days, balances = [], []
+            sequence = self.journal_sequence
+            for event in events:
+                if event['seq'] <= self.journal_sequence:
+                    continue
+                when = datetime.datetime.strptime(event['time'], '%Y-%m-%d %H:%M:%S').date()
+                days.append(date_to_day(when))
+                balances.append(event['balance'])
+                sequence = max(sequence, event['seq'])
+            if days:
+                self.actuals.append({'day': np.array(days), 'balance': np.array(balances)})
+                self.journal_sequence = sequence
+                self._commit()
+        return len(days)
+
+    def actual_balances(self, first_day=None, last_day=None):
+        """(days, balances): the closing actual balance of each recorded day, sorted"""
+        days = np.asarray(self.actuals.column('day'), dtype=np.int64)
+        balances = np.asarray(self.actuals.column('balance'))
+        if not len(days):
+            return days, balances
+        # The last record per day wins: stable-sort by day, keep each run's end
+        order = np.argsort(days, kind='stable')
+        days, balances = days[order], balances[order]
+        last = np.append(days[1:] != days[:-1], True)
+        days, balances = days[last], balances[last]
+        keep = np.ones(len(days), dtype=bool)
+        if first_day is not None:
+            keep &= days >= first_day
+        if last_day is not None:
+            keep &= days <= last_day
+        return days[keep], balances[keep]
+
+    def forecasts_for(self, days, lead=None):
+        """Forecast columns for each of a sorted array of days.
+
+        Each day takes the newest snapshot made before it, or with lead
+        the snapshot made exactly lead days before it. Returns a dict of
+        arrays aligned with days; balance and the flows are NaN and
+        snapshot is -1 where no snapshot covers a day.
+        """
+        days = np.asarray(days, dtype=np.int64)
+        found = {name: np.full(len(days), np.nan) for name in ('balance',) + CATEGORIES}
+        found['snapshot'] = np.full(len(days), -1, dtype=np.int64)
+        if not len(days) or not self.snapshots.rows:
+            return found
+        # Only snapshots from SNAPSHOT_DAYS before the first day onwards can cover the range
+        snapshot_column = self.snapshots.column('snapshot')
+        lo = int(np.searchsorted(snapshot_column, days[0] - SNAPSHOT_DAYS, side='left'))
+        hi = int(np.searchsorted(snapshot_column, days[-1], side='right'))
+        columns = {name: self.snapshots.column(name) for name in SNAPSHOT_COLUMNS}
+        for start in range(lo, hi, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, hi)
+            day = np.asarray(columns['day'][start:stop], dtype=np.int64)
+            snapshot = np.asarray(columns['snapshot'][start:stop], dtype=np.int64)
+            at = np.minimum(np.searchsorted(days, day), len(days) - 1)
+            match = days[at] == day
+            match &= snapshot == day - lead if lead is not None else snapshot < day
+            if not match.any():
+                continue
+            rows = np.flatnonzero(match)
+            # Rows are in snapshot order, so the last row per day is its newest snapshot
+            targets = at[rows]
+            _, first = np.unique(targets[::-1], return_index=True)
+            rows = rows[len(rows) - 1 - first]
+            targets = at[rows]
+            found['snapshot'][targets] = snapshot[rows]
+            for name in ('balance',) + CATEGORIES:
+                found[name][targets] = columns[name][start:stop][rows]
+        return found
+
+    def daily_variance(self, first_day=None, last_day=None, lead=None):
+        """Forecast against actual balance for every day with an actual balance and a forecast"""
+        days, actual = self.actual_balances(first_day, last_day)
+        forecast = self.forecasts_for(days, lead)
+        covered = forecast['snapshot'] >= 0
+        return {
+            'day': days[covered],
+            'snapshot': forecast['snapshot'][covered],
+            'lead': (days - forecast['snapshot'])[covered],
+            'forecast': forecast['balance'][covered],
+            'actual': actual[covered],
+            'variance': (actual - forecast['balance'])[covered],
+        }
+
+    def category_variance(self, transactions, first_day, last_day, bill_merchants=(), lead=None):
+        """Per-month forecast against actual flow for income, bills and spending.
+
+        transactions is a dict of columns from TransactionStore.transactions();
+        outflows to a merchant id in bill_merchants count as bills and
+        other outflows as spending. Only days with a forecast are counted
+        on either side. Returns per-month arrays: month, days, then
+        <category>_forecast, <category>_actual and <category>_variance.
+        """
+        days = np.arange(first_day, last_day + 1)
+        forecast = self.forecasts_for(days, lead)
+        covered = forecast['snapshot'] >= 0
+        days = days[covered]
+        report = {'month': np.empty(0, dtype='M8[M]'), 'days': np.empty(0, dtype=np.int64)}
+        for name in CATEGORIES:
+            for side in ('forecast', 'actual', 'variance'):
+                report[f'{name}_{side}'] = np.empty(0)
+        if not len(days):
+            return report
+
+        # Actual flows per covered day, from the transactions falling on one
+        day = np.asarray(transactions['day'], dtype=np.int64)
+        at = np.minimum(np.searchsorted(days, day), len(days) - 1)
+        keep = days[at] == day
+        at = at[keep]
+        amount = np.asarray(transactions['amount_cents'], dtype=np.int64)[keep] / 100
+        is_bill = np.isin(np.asarray(transactions['merchant'])[keep], np.fromiter(bill_merchants, dtype=np.int64))
+        actual = {name: np.zeros(len(days)) for name in CATEGORIES}
+        for name, rows in (('income', amount > 0), ('bills', (amount < 0) & is_bill),
+                           ('spending', (amount < 0) & ~is_bill)):
+            np.add.at(actual[name], at[rows], np.abs(amount[rows]))
+
+        month = (np.datetime64('1970-01-01', 'D') + days).astype('M8[M]')
+        starts = np.flatnonzero(np.append(True, month[1:] != month[:-1]))
+        report['month'] = month[starts]
+        report['days'] = np.diff(np.append(starts, len(days)))
+        for name in CATEGORIES:
+            predicted = np.add.reduceat(forecast[name][covered], starts)
+            observed = np.add.reduceat(actual[name], starts)
+            report[f'{name}_forecast'] = predicted
+            report[f'{name}_actual'] = observed
+            report[f'{name}_variance'] = observed - predicted
+        return report
+
+
+def summarize(variance):
+    """Mean error (bias), mean absolute error and worst miss of a daily_variance report"""
+    errors = variance['variance']
+    if not len(errors):
+        return {'days': 0, 'bias': 0.0, 'mean_abs_error': 0.0, 'worst_day': None, 'worst_error': 0.0}
+    worst = int(np.argmax(np.abs(errors)))
+    return {
+        'days': len(errors),
+        'bias': float(errors.mean()),
+        'mean_abs_error': float(np.abs(errors).mean()),
+        'worst_day': day_to_date(variance['day'][worst]),
+        'worst_error': float(errors[worst]),
+    }
+
+
+def main(argv=None):
+    import statement_import
+    import recurring_detect
+    from balance_journal import BalanceJournal
+
+    parser = argparse.ArgumentParser(description="Report forecast accuracy against actual balances")
+    parser.add_argument('--store', default=STORE_DIR, help="reconciliation directory (default: reconciliation)")
+    parser.add_argument('--balance-file', help="copy new actual balances from this balance file's journal first")
+    parser.add_argument('--transactions', default=statement_import.STORE_DIR, help="transaction store for category flows")
+    parser.add_argument('--lead', type=int, help="compare forecasts made exactly this many days ahead")
+    parser.add_argument('--first', type=datetime.date.fromisoformat, help="first day (default: a year ago)")
+    parser.add_argument('--last', type=datetime.date.fromisoformat, help="last day (default: today)")
+    args = parser.parse_args(argv)
+
+    store = ReconciliationStore(args.store)
+    if args.balance_file:
+        print(f"{store.import_journal(BalanceJournal(args.balance_file).history())} new actual balances",
+              file=sys.stderr)
+    last = args.last or datetime.date.today()
+    first = args.first or last - datetime.timedelta(days=365)
+
+    summary = summarize(store.daily_variance(date_to_day(first), date_to_day(last), args.lead))
+    print(f"{summary['days']} days reconciled: bias {summary['bias']:+,.2f}, "
+          f"mean abs error {summary['mean_abs_error']:,.2f}, "
+          f"worst {summary['worst_error']:+,.2f} on {summary['worst_day']}")
+
+    transactions = statement_import.TransactionStore(args.transactions)
+    bills = [charge.merchant for charge in recurring_detect.detect_store(transactions)
+             if charge.confidence >= recurring_detect.MIN_CONFIDENCE]
+    report = store.category_variance(transactions.transactions(date_to_day(first), date_to_day(last)),
+                                     date_to_day(first), date_to_day(last), bills, args.lead)
+    for i, month in enumerate(report['month']):
+        print(f"{month}  " + "  ".join(
+            f"{name} {report[f'{name}_actual'][i]:>10,.2f} vs {report[f'{name}_forecast'][i]:>10,.2f} "
+            f"({report[f'{name}_variance'][i]:+,.2f})" for name in CATEGORIES))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Recurrence rules for income and bills, compiled once and expanded in bulk"""
+import datetime
+
+import numpy as np
+
+INTERVAL = 'interval'
+MONTHLY = 'monthly'
+NTH_WEEKDAY = 'nth_weekday'
+ANNUAL = 'annual'
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Open-ended start/end bounds, in days since epoch
+NO_START = np.iinfo(np.int64).min // 2
+NO_END = np.iinfo(np.int64).max // 2
+
+
+def _day(d, default):
+    return default if d is None else d.toordinal() - EPOCH_ORDINAL
+
+
+class RecurrenceRule:
+    """A named cash flow that repeats on a schedule.
+
+    amount is signed: income is positive, bills are negative. Use the
+    every/monthly/nth_weekday/annual constructors rather than __init__.
+    """
+
+    def __init__(self, name, amount, kind, category=None, start=None, end=None,
+                 period_days=None, anchor=None, day=None, clamp=True,
+                 weekday=None, nth=None, month=None):
+        self.name = name
+        self.amount = float(amount)
+        self.kind = kind
+        self.category = category or ('income' if amount > 0 else 'bill')
+        self.start = start
+        self.end = end
+        self.period_days = period_days
+        self.anchor = anchor
+        self.day = day
+        self.clamp = clamp
+        self.weekday = weekday
+        self.nth = nth
+        self.month = month
+
+    @classmethod
+    def every(cls, name, amount, anchor, days=0, weeks=0, **kwargs):
+        """Every N days/weeks counting from anchor (the first occurrence)"""
+        period = days + 7 * weeks
+        if period <= 0:
+            raise ValueError("Interval rules need a positive period")
+        kwargs.setdefault('start', anchor)
+        return cls(name, amount, INTERVAL, period_days=period, anchor=anchor, **kwargs)
+
+    @classmethod
+    def monthly(cls, name, amount, day, clamp=True, **kwargs):
+        """On a day of the month; clamp moves day 29-31 to the last day of short months"""
+        if not 1 <= day <= 31:
+            raise ValueError(f"Invalid day of month: {day}")
+        return cls(name, amount, MONTHLY, day=day, clamp=clamp, **kwargs)
+
+    @classmethod
+    def nth_weekday(cls, name, amount, nth, weekday, **kwargs):
+        """On the nth weekday of each month (weekday 0=Monday, nth=-1 for the last)"""
+        if nth == 0 or not -5 <= nth <= 5 or not 0 <= weekday <= 6:
+            raise ValueError(f"Invalid nth weekday: {nth}, {weekday}")
+        return cls(name, amount, NTH_WEEKDAY, nth=nth, weekday=weekday, **kwargs)
+
+    @classmethod
+    def annual(cls, name, amount, month, day, **kwargs):
+        """Once a year; Feb 29 falls on Feb 28 in common years"""
+        datetime.date(2000, month, day)
+        return cls(name, amount, ANNUAL, month=month, day=day, **kwargs)
+
+    def key(self):
+        """Hashable description used for schedule fingerprints"""
+        return (self.name, self.amount, self.kind, self.category,
+                self.start.isoformat() if self.start else None,
+                self.end.isoformat() if self.end else None,
+                self.period_days, self.anchor.isoformat() if self.anchor else None,
+                self.day, self.clamp, self.weekday, self.nth, self.month)
+
+    def label(self):
+        """Transaction text as shown in the forecast table"""
+        sign = '+' if self.amount > 0 else '-'
+        return f"{self.name}: {sign}${abs(self.amount):.2f}"
+
+    def __repr__(self):
+        return f"RecurrenceRule({self.name!r}, {self.amount}, {self.kind!r})"
+
+
+def nth_weekday_of_month(year, month, weekday, nth):
+    """The nth weekday of a month, or None if the month has no such day"""
+    months = np.array([(year - 1970) * 12 + month - 1]).astype('datetime64[M]')
+    month_start, month_len = _month_bounds(months)
+    days, valid = nth_weekday_days(month_start, month_len, weekday, nth)
+    return datetime.date.fromordinal(int(days[0]) + EPOCH_ORDINAL) if valid[0] else None
+
+
+def nth_weekday_days(month_start, month_len, weekday, nth):
+    """Closed-form nth weekday for whole arrays of months at once.
+
+    month_start/month_len are days since epoch and month lengths; weekday
+    and nth broadcast against them. Returns (days, valid) where valid is
+    False for months without an nth weekday (e.g. a 5th Friday).
+    """
+    nth = np.asarray(nth)
+    first_weekday = (month_start + 3) % 7
+    from_start = month_start + (weekday - first_weekday) % 7 + 7 * (nth - 1)
+    month_end = month_start + month_len - 1
+    last_weekday = (month_end + 3) % 7
+    from_end = month_end - (last_weekday - weekday) % 7 - 7 * (-nth - 1)
+    days = np.where(nth > 0, from_start, from_end)
+    valid = (days >= month_start) & (days <= month_end)
+    return days, valid
+
+
+def nth_weekdays(start_date, end_date, nth, weekday):
+    """Every nth weekday of the month between two dates (inclusive), in one pass"""
+    lo = start_date.toordinal() - EPOCH_ORDINAL
+    hi = end_date.toordinal() - EPOCH_ORDINAL + 1
+    if hi <= lo:
+        return []
+    month_start, month_len = _month_bounds(_months(lo, hi))
+    days, valid = nth_weekday_days(month_start, month_len, weekday, nth)
+    days = days[valid & (days >= lo) & (days < hi)]
+    return [datetime.date.fromordinal(day + EPOCH_ORDINAL) for day in days.tolist()]
+
+
+def _month_bounds(months):
+    """Start day (since epoch) and length of each datetime64[M] month"""
+    month_start = months.astype('datetime64[D]').astype(np.int64)
+    month_len = (months + 1).astype('datetime64[D]').astype(np.int64) - month_start
+    return month_start, month_len
+
+
+def _months(lo, hi):
+    """Month starts (datetime64[M]) covering the day range [lo, hi)"""
+    first = np.datetime64(int(lo), 'D').astype('datetime64[M]')
+    last = np.datetime64(int(hi) - 1, 'D').astype('datetime64[M]')
+    return np.arange(first, last + 1)
+
+
+class CompiledSchedule:
+    """Rules grouped by kind into parameter arrays, ready for bulk expansion"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.amounts = np.array([rule.amount for rule in self.rules], dtype=float)
+        self.categories = np.array([rule.category for rule in self.rules], dtype=object)
+        self.labels = [rule.label() for rule in self.rules]
+        start = np.array([_day(rule.start, NO_START) for rule in self.rules], dtype=np.int64)
+        end = np.array([_day(rule.end, NO_END) for rule in self.rules], dtype=np.int64)
+
+        def group(kind, *fields):
+            idx = np.array([i for i, rule in enumerate(self.rules) if rule.kind == kind], dtype=np.int64)
+            params = {field: np.array([getattr(self.rules[i], field) for i in idx]) for field in fields}
+            params['index'] = idx
+            params['start'] = start[idx]
+            params['end'] = end[idx]
+            return params
+
+        self._interval = group(INTERVAL, 'period_days')
+        self._interval['anchor'] = np.array(
+            [_day(self.rules[i].anchor, 0) for i in self._interval['index']], dtype=np.int64
+        )
+        self._monthly = group(MONTHLY, 'day', 'clamp')
+        self._nth_weekday = group(NTH_WEEKDAY, 'nth', 'weekday')
+        self._annual = group(ANNUAL, 'month', 'day')
+
+    def category_mask(self, category):
+        return self.categories == category
+
+    def _expand_interval(self, lo, hi):
+        g = self._interval
+        if not len(g['index']):
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        period = g['period_days'].astype(np.int64)
+        first = np.maximum(lo, g['start'])
+        steps = np.maximum(0, -(-(first - g['anchor']) // period))
+        first_occ = g['anchor'] + steps * period
+        bound = np.minimum(hi, g['end'] + 1)
+        count = np.maximum(0, -(-(bound - first_occ) // period))
+        total = int(count.sum())
+        within = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        days = np.repeat(first_occ, count) + within * np.repeat(period, count)
+        return days, np.repeat(g['index'], count)
+
+    def _expand_monthly(self, lo, hi):
+        g = self._monthly
+        if not len(g['index']):
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        month_start, month_len = _month_bounds(_months(lo, hi))
+        dom = g['day'][:, None]
+        valid = g['clamp'][:, None] | (dom <= month_len[None, :])
+        days = month_start[None, :] + np.minimum(dom, month_len[None, :]) - 1
+        keep = (valid & (days >= lo) & (days < hi)
+                & (days >= g['start'][:, None]) & (days <= g['end'][:, None]))
+        rule_pos, _ = np.nonzero(keep)
+        return days[keep], g['index'][rule_pos]
+
+    def _expand_nth_weekday(self, lo, hi):
+        g = self._nth_weekday
+        if not len(g['index']):
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        month_start, month_len = _month_bounds(_months(lo, hi))
+        days, valid = nth_weekday_days(month_start[None, :], month_len[None, :],
+                                       g['weekday'][:, None], g['nth'][:, None])
+        keep = (valid & (days >= lo) & (days < hi)
+                & (days >= g['start'][:, None]) & (days <= g['end'][:, None]))
+        rule_pos, _ = np.nonzero(keep)
+        return days[keep], g['index'][rule_pos]
+
+    def _expand_annual(self, lo, hi):
+        g = self._annual
+        if not len(g['index']):
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        first_year = np.datetime64(int(lo), 'D').astype('datetime64[Y]').astype(np.int64)
+        last_year = np.datetime64(int(hi) - 1, 'D').astype('datetime64[Y]').astype(np.int64)
+        years = np.arange(first_year, last_year + 1)
+        months = (years[None, :] * 12 + (g['month'][:, None] - 1)).astype('datetime64[M]')
+        month_start, month_len = _month_bounds(months)
+        days = month_start + np.minimum(g['day'][:, None], month_len) - 1
+        keep = ((days >= lo) & (days < hi)
+                & (days >= g['start'][:, None]) & (days <= g['end'][:, None]))
+        rule_pos, _ = np.nonzero(keep)
+        return days[keep], g['index'][rule_pos]
+
+    def occurrences(self, start_date, num_days):
+        """All occurrences in [start_date, start_date + num_days).
+
+        Returns (offset, rule_index) arrays sorted by day offset and then
+        by rule order, so same-day events apply in the order rules were given.
+        """
+        lo = start_date.toordinal() - EPOCH_ORDINAL
+        hi = lo + num_days
+        if num_days <= 0 or not self.rules:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        parts = [self._expand_interval(lo, hi), self._expand_monthly(lo, hi),
+                 self._expand_nth_weekday(lo, hi), self._expand_annual(lo, hi)]
+        days = np.concatenate([p[0] for p in parts]).astype(np.int64)
+        index = np.concatenate([p[1] for p in parts]).astype(np.int64)
+        offsets = days - lo
+        order = np.lexsort((index, offsets))
+        return offsets[order], index[order]
+
+    def dates_for(self, rule_index, start_date, num_days):
+        """Dates of one rule's occurrences in [start_date, start_date + num_days)"""
+        offsets, index = self.occurrences(start_date, num_days)
+        return [start_date + datetime.timedelta(days=int(o)) for o in offsets[index == rule_index]]
+
+
+def compile_rules(rules):
+    """Compile rules once for repeated bulk expansion"""
+    return CompiledSchedule(rules)
@@ -0,0 +1,270 @@
+"""Detect recurring charges in imported transaction history.
+
+    python recurring_detect.py --store transactions
+    python recurring_detect.py --account checking --min-confidence 0.7 --json
+
+Outflows are grouped by account, merchant and amount: after one lexsort,
+a new group starts wherever the merchant changes or the amount jumps by
+more than AMOUNT_TOLERANCE, so gradual price changes stay in one group.
+An exact-amount pass runs first, so two subscriptions at one merchant
+with close prices are found separately. A second sort orders each group
+by day. The gaps between
+consecutive charges are then matched against each pattern's band in one
+np.add.reduceat pass over all groups. Only groups that look periodic
+reach the per-group Python code, so years of history take well under a
+second.
+
+Confidence combines:
+- regularity: the fraction of gaps inside the pattern's band (and, for
+  monthly charges, of charges near the usual day of the month)
+- support: how many occurrences back it up
+- amount stability
+- recency: a charge that has stopped recurring is marked inactive and
+  scored down
+"""
+import argparse
+import datetime
+import json
+import sys
+
+import numpy as np
+
+import recurrence
+import statement_import
+
+# Amounts within this fraction of the previous one (or AMOUNT_SLACK_CENTS)
+# belong to the same recurring charge
+AMOUNT_TOLERANCE = 0.15
+AMOUNT_SLACK_CENTS = 100
+
+# pattern: (min gap, max gap, period in days, occurrences needed, occurrences for full support)
+PATTERNS = {
+    'biweekly': (12, 16, 14.0, 4, 7),
+    'monthly': (26, 35, 30.44, 3, 6),
+    'annual': (355, 375, 365.25, 3, 4),
+}
+# Charges this many days from the usual day of the month still count as on time
+DAY_SLACK = 3
+MIN_REGULARITY = 0.6
+# Confidence multiplier for charges that have stopped recurring
+STALE_WEIGHT = 0.25
+MIN_CONFIDENCE = 0.5
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+class RecurringCharge:
+    """A proposed recurring bill and the evidence for it"""
+
+    def __init__(self, name, account, pattern, amount, day, first_date, last_date,
+                 occurrences, regularity, stability, active, confidence, merchant=None):
+        self.name = name
+        # Merchant id in the transaction store's dictionary
+        self.merchant = merchant
+        self.account = account
+        self.pattern = pattern
+        self.amount = amount
+        # Day of the month for monthly charges; annual ones recur on last_date's month and day
+        self.day = day
+        self.first_date = first_date
+        self.last_date = last_date
+        self.occurrences = occurrences
+        self.regularity = regularity
+        self.stability = stability
+        self.active = active
+        self.confidence = confidence
+
+    def rule(self):
+        """The charge as a recurrence rule (a bill, so a negative amount)"""
+        if self.pattern == 'monthly':
+            return recurrence.RecurrenceRule.monthly(self.name, -self.amount, self.day)
+        if self.pattern == 'annual':
+            return recurrence.RecurrenceRule.annual(self.name, -self.amount, self.last_date.month,
+                                                    self.last_date.day)
+        return recurrence.RecurrenceRule.every(self.name, -self.amount, self.last_date, weeks=2)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'account': self.account,
+            'pattern': self.pattern,
+            'amount': self.amount,
+            'day': self.day,
+            'first_date': self.first_date.isoformat(),
+            'last_date': self.last_date.isoformat(),
+            'occurrences': self.occurrences,
+            'regularity': round(self.regularity, 3),
+            'stability': round(self.stability, 3),
+            'active': self.active,
+            'confidence': round(self.confidence, 3),
+        }
+
+
+def _date(day):
+    return datetime.date.fromordinal(int(day) + statement_import.EPOCH_ORDINAL)
+
+
+def _group_starts(*keys):
+    """Start index of each run of equal rows in sorted key columns"""
+    n = len(keys[0])
+    new = np.zeros(n, dtype=bool)
+    new[:1] = True
+    for key in keys:
+        new[1:] |= key[1:] != key[:-1]
+    return new
+
+
+def _scan(days, cents, merchant, account, tolerance, slack, as_of, min_regularity):
+    """(rows, pattern, day, regularity, stability, active, confidence) per periodic group"""
+    if not len(days):
+        return
+    row = np.arange(len(days))
+
+    # Split each merchant's charges into amount groups
+    order = np.lexsort((cents, merchant, account))
+    sorted_cents = cents[order]
+    new = _group_starts(merchant[order], account[order])
+    new[1:] |= sorted_cents[1:] > sorted_cents[:-1] * (1 + tolerance) + slack
+    group = np.empty(len(days), dtype=np.int64)
+    group[order] = np.cumsum(new) - 1
+
+    # Order each group by day; gap[i] is the days since the group's previous charge
+    order = np.lexsort((days, group))
+    days, cents, group, row = days[order], cents[order], group[order], row[order]
+    starts = np.flatnonzero(_group_starts(group))
+    counts = np.diff(np.append(starts, len(days)))
+    gap = np.empty(len(days), dtype=np.int64)
+    gap[0] = -1
+    gap[1:] = days[1:] - days[:-1]
+    gap[starts] = -1
+    gaps = np.maximum(counts - 1, 1)
+
+    amount = cents / 100
+    mean = np.add.reduceat(amount, starts) / counts
+    variance = np.maximum(np.add.reduceat(amount * amount, starts) / counts - mean * mean, 0.0)
+    stability = np.clip(1 - np.sqrt(variance) / mean, 0.0, 1.0)
+
+    dates = EPOCH + days
+    day_of_month = (dates - dates.astype('M8[M]')).astype(np.int64) + 1
+
+    for pattern, (low, high, period, needed, full) in PATTERNS.items():
+        regularity = np.add.reduceat((gap >= low) & (gap <= high), starts) / gaps
+        for g in np.flatnonzero((counts >= needed) & (regularity >= min_regularity)):
+            lo, hi = starts[g], starts[g] + counts[g]
+            fit = float(regularity[g])
+            day = None
+            if pattern == 'monthly':
+                on_day = day_of_month[lo:hi]
+                day = int(np.bincount(on_day, minlength=32).argmax())
+                fit = min(fit, float(np.mean(np.abs(on_day - day) <= DAY_SLACK)))
+                if fit < min_regularity:
+                    continue
+            active = as_of - days[hi - 1] <= period * 1.5 + DAY_SLACK
+            support = min(1.0, (counts[g] - 1) / (full - 1))
+            confidence = fit * support * (0.5 + 0.5 * float(stability[g]))
+            if not active:
+                confidence *= STALE_WEIGHT
+            yield row[lo:hi], pattern, day, fit, float(stability[g]), bool(active), confidence
+
+
+def detect(columns, merchants, accounts=None, as_of=None, tolerance=AMOUNT_TOLERANCE,
+           min_regularity=MIN_REGULARITY):
+    """Recurring charges in a dict of transaction columns, most confident first.
+
+    columns is what TransactionStore.transactions() returns; merchants
+    and accounts are the store's dictionaries. as_of (days since
+    1970-01-01) is the end of the history, by default its last day.
+    """
+    outflow = np.asarray(columns['amount_cents']) < 0
+    days = np.asarray(columns['day'], dtype=np.int64)[outflow]
+    cents = -np.asarray(columns['amount_cents'], dtype=np.int64)[outflow]
+    merchant = np.asarray(columns['merchant'], dtype=np.int64)[outflow]
+    account = np.asarray(columns['account'], dtype=np.int64)[outflow]
+    if not len(days):
+        return []
+    if as_of is None:
+        as_of = int(days.max())
+
+    found = []
+    remaining = np.arange(len(days))
+    # Exact amounts first, so two subscriptions at one merchant with close
+    # prices stay apart; the tolerant pass then finds varying bills among the rest
+    for amount_tolerance, slack in ((0.0, 0), (tolerance, AMOUNT_SLACK_CENTS)):
+        if not len(remaining):
+            break
+        used = np.zeros(len(remaining), dtype=bool)
+        for rows, pattern, day, fit, stability, active, confidence in _scan(
+                days[remaining], cents[remaining], merchant[remaining], account[remaining],
+                amount_tolerance, slack, as_of, min_regularity):
+            used[rows] = True
+            rows = remaining[rows]
+            found.append(RecurringCharge(
+                name=merchants[merchant[rows[0]]].title(),
+                account=accounts[account[rows[0]]] if accounts is not None else int(account[rows[0]]),
+                pattern=pattern,
+                # The latest charges reflect the current price
+                amount=round(float(np.median(cents[rows[-3:]])) / 100, 2),
+                day=day,
+                first_date=_date(days[rows[0]]),
+                last_date=_date(days[rows[-1]]),
+                occurrences=len(rows),
+                regularity=fit,
+                stability=stability,
+                active=active,
+                confidence=confidence,
+                merchant=int(merchant[rows[0]]),
+            ))
+        remaining = remaining[~used]
+    found.sort(key=lambda charge: (-charge.confidence, charge.name))
+    return found
+
+
+def detect_store(store, account=None, first_day=None, last_day=None, **kwargs):
+    """Recurring charges in a TransactionStore (optionally one account or day range)"""
+    columns = store.transactions(first_day, last_day, account)
+    return detect(columns, store.merchants, store.accounts, **kwargs)
+
+
+def proposed_monthly_expenses(charges, min_confidence=MIN_CONFIDENCE):
+    """Active monthly charges in the forecaster's {day: [(name, amount)]} form"""
+    schedule = {}
+    for charge in charges:
+        if charge.pattern == 'monthly' and charge.active and charge.confidence >= min_confidence:
+            schedule.setdefault(charge.day, []).append((charge.name, charge.amount))
+    return dict(sorted(schedule.items()))
+
+
+def proposed_rules(charges, min_confidence=MIN_CONFIDENCE):
+    """Recurrence rules for the active bi-weekly and annual charges"""
+    return [charge.rule() for charge in charges
+            if charge.pattern != 'monthly' and charge.active and charge.confidence >= min_confidence]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose recurring bills from imported transactions")
+    parser.add_argument('--store', default=statement_import.STORE_DIR, help="store directory (default: transactions)")
+    parser.add_argument('--account', help="only this account")
+    parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE)
+    parser.add_argument('--all', action='store_true', help="include inactive and low-confidence charges")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    store = statement_import.TransactionStore(args.store)
+    charges = detect_store(store, args.account)
+    if not args.all:
+        charges = [charge for charge in charges if charge.active and charge.confidence >= args.min_confidence]
+    if args.json:
+        json.dump([charge.to_dict() for charge in charges], sys.stdout, indent=2)
+        print()
+        return 0
+    for charge in charges:
+        when = {'monthly': f"day {charge.day}", 'biweekly': f"every 2 weeks from {charge.last_date}",
+                'annual': charge.last_date.strftime('%b %d')}[charge.pattern]
+        print(f"{charge.confidence:5.2f}  {charge.pattern:<8}  ${charge.amount:>9,.2f}  {when:<28}  "
+              f"{charge.name} ({charge.occurrences}x{'' if charge.active else ', inactive'})")
+    print(f"{len(charges)} recurring charges from {len(store):,} transactions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
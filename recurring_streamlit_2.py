@@ -1,348 +1,71 @@
 import streamlit as st
 import datetime
-from datetime import timedelta
-import os
 import json
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import numpy as np
 import pandas as pd
 
-class PersonalFinanceForecaster:
-    def __init__(self):
-        self.balance_file = "finance_balance.json"
-        
-        # Load saved balance or start with 0
-        self.current_balance = self.load_balance()
-        self.daily_expenses = 100.0
-        
-        # Monthly recurring expenses from Excel file
-        self.monthly_expenses = {
-            1: [("Davis Schools Lunch", 20.00)],
-            2: [("Kindle", 13.93), ("Audible", 16.03), ("Harp", 150.00), ("Kohls", 100.00), ("Grass Roots Coop", 158.76)],
-            4: [("Kindle", 12.86), ("Paypal Instant", 36.24)],
-            5: [("Mint mobile", 130.00)],
-            6: [("T-MOBILE Handset", 83.37), ("South Davis Rec", 40.00)],
-            8: [("Mint mobile", 130.76)],
-            12: [("JSB Guitar", 35.00), ("Mortgage", 930.00)],
-            13: [("Internet", 61.10)],
-            15: [("Netflix", 20.00), ("Claude", 22.00)],
-            18: [("Phone Rob", 124.64)],
-            19: [("ChatGPT", 20.00), ("CAP 1 Mike", 110.00), ("Sewer", 75.00)],
-            20: [("Foundation Furnace", 110.00)],
-            21: [("Cap 1 Rob", 220.00), ("Merinda Harp", 50.00)],
-            22: [("Allstate Car insurance", 322.88), ("T-Mobile", 113.00)],
-            23: [("Psych", 25.00)],
-            25: [("Car Payment", 420.00)],
-            27: [("Ryan xfer", 300.00), ("Gas", 30.00), ("NYTimes", 25.00), ("Psych", 25.00), ("Paypal", 30.00)],
-            28: [("Paypal", 13.00)],
-            29: [("Orthodontics", 119.00), ("Paypal 2", 26.95), ("Dominion", 74.00)],
-            30: [("Rose", 25.00), ("Paypal 2", 26.95)]
-        }
-        
-        self.bi_weekly_pay = 2700.0
-        self.social_security = 2600.0
+import forecast_engine
+import forecast_export
+import perf_timing
+import reconciliation
+import recurring_detect
+import simulation
+import statement_import
+from shared_state import SharedForecaster
+from forecast_cache import LRUCache
+from chart_cache import ChartCache
 
-    def load_balance(self):
-        """Load the saved balance from file"""
-        try:
-            if os.path.exists(self.balance_file):
-                with open(self.balance_file, 'r') as f:
-                    data = json.load(f)
-                    balance = data.get('current_balance', 0.0)
-                    return balance
-            else:
-                return 0.0
-        except Exception as e:
-            st.error(f"Error loading balance: {e}")
-            return 0.0
+DEFAULT_FORECAST_DAYS = 20
+MAX_FORECAST_DAYS = 3650
+TABLE_PAGE_SIZES = [100, 250, 1000]
+DEFAULT_BALANCE_FLOOR = 500.0
+GRANULARITIES = {"Auto": None, "Daily": 'day', "Weekly": 'week', "Monthly": 'month'}
 
-    def save_balance(self):
-        """Save the current balance to file"""
-        try:
-            data = {
-                'current_balance': self.current_balance,
-                'last_updated': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            with open(self.balance_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            st.error(f"Error saving balance: {e}")
+def paged_rows(total, unit, key="table"):
+    """Page size and page controls for a long table; returns the (start, stop) rows to show"""
+    if total <= min(TABLE_PAGE_SIZES):
+        return 0, total
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", TABLE_PAGE_SIZES, key=f"{key}_page_size")
+    pages = -(-total // page_size)
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    stop = min(start + page_size, total)
+    with col3:
+        st.caption(f"{unit} {start + 1:,}–{stop:,} of {total:,}")
+    return start, stop
 
-    def set_current_balance(self, balance):
-        """Update the current balance and save it"""
-        self.current_balance = float(balance)
-        self.save_balance()
+@st.cache_resource
+def get_shared_forecaster():
+    """The forecaster every session shares; loaded once per process, not once per session"""
+    return SharedForecaster()
 
-    def update_balance(self, amount, description="Balance adjustment"):
-        """Add or subtract an amount from the current balance"""
-        self.current_balance += amount
-        self.save_balance()
-        return f"{description}: {amount:+.2f}"
+@st.cache_resource
+def get_forecast_caches():
+    """Process-wide caches that survive reruns: forecast results, expense summaries, chart images"""
+    return {
+        'forecast': LRUCache(maxsize=64),
+        'summary': LRUCache(maxsize=16),
+        'chart': ChartCache(),
+        'simulation': LRUCache(maxsize=8),
+        'export': LRUCache(maxsize=8)
+    }
 
-    def find_fourth_wednesday(self, year, month):
-        """Find the 4th Wednesday of a given month"""
-        first_day = datetime.date(year, month, 1)
-        days_to_first_wed = (2 - first_day.weekday()) % 7
-        first_wednesday = first_day + timedelta(days=days_to_first_wed)
-        fourth_wednesday = first_wednesday + timedelta(weeks=3)
-        
-        if fourth_wednesday.month == month:
-            return fourth_wednesday
-        else:
-            return first_wednesday + timedelta(weeks=2)
+def compute_and_record(forecaster, num_days):
+    """Compute the forecast and keep its first SNAPSHOT_DAYS as today's reconciliation snapshot.
 
-    def get_bi_weekly_pay_dates(self, start_date, num_days):
-        """Get all bi-weekly pay dates starting June 13, 2025"""
-        pay_dates = []
-        first_pay_date = datetime.date(2025, 6, 13)
-        end_date = start_date + timedelta(days=num_days)
-        
-        current_pay_date = first_pay_date
-        if start_date > first_pay_date:
-            weeks_since = (start_date - first_pay_date).days // 7
-            cycles_passed = weeks_since // 2
-            current_pay_date = first_pay_date + timedelta(weeks=(cycles_passed + 1) * 2)
-        
-        while current_pay_date <= end_date:
-            if current_pay_date >= start_date:
-                pay_dates.append(current_pay_date)
-            current_pay_date += timedelta(weeks=2)
-        
-        return pay_dates
-
-    def get_social_security_dates(self, start_date, num_days):
-        """Get all Social Security payment dates (4th Wednesday)"""
-        ss_dates = []
-        end_date = start_date + timedelta(days=num_days)
-        
-        current_year = max(2025, start_date.year)
-        current_month = 6 if current_year == 2025 and start_date.month < 6 else start_date.month
-        
-        for _ in range(6):
-            if current_year > end_date.year or (current_year == end_date.year and current_month > end_date.month):
-                break
-                
-            fourth_wed = self.find_fourth_wednesday(current_year, current_month)
-            if start_date <= fourth_wed <= end_date:
-                ss_dates.append(fourth_wed)
-            
-            current_month += 1
-            if current_month > 12:
-                current_month = 1
-                current_year += 1
-        
-        return ss_dates
-
-    def generate_forecast_data(self, num_days=20):
-        """Generate forecast data and return it for display"""
-        start_date = datetime.date.today()
-        running_balance = self.current_balance
-        
-        # Get all scheduled transactions
-        pay_dates = self.get_bi_weekly_pay_dates(start_date, num_days)
-        ss_dates = self.get_social_security_dates(start_date, num_days)
-        
-        forecast_data = []
-        dates = []
-        balances = []
-        daily_changes = []
-        
-        for i in range(num_days + 1):
-            if i == 0:
-                dates.append(start_date)
-                balances.append(running_balance)
-                daily_changes.append(0)
-            else:
-                current_date = start_date + timedelta(days=i-1)
-                daily_change = 0
-                transactions = []
-                
-                # Daily expenses
-                daily_change -= self.daily_expenses
-                transactions.append(f"Daily expenses: -${self.daily_expenses:.2f}")
-                
-                # Check for bi-weekly pay
-                if current_date in pay_dates:
-                    daily_change += self.bi_weekly_pay
-                    transactions.append(f"Bi-weekly pay: +${self.bi_weekly_pay:.2f}")
-                
-                # Check for Social Security
-                if current_date in ss_dates:
-                    daily_change += self.social_security
-                    transactions.append(f"Social Security: +${self.social_security:.2f}")
-                
-                # Check for monthly expenses
-                day_of_month = current_date.day
-                if day_of_month in self.monthly_expenses:
-                    for desc, amount in self.monthly_expenses[day_of_month]:
-                        daily_change -= amount
-                        transactions.append(f"{desc}: -${amount:.2f}")
-                
-                running_balance += daily_change
-                
-                forecast_data.append({
-                    'Date': current_date,
-                    'Day': current_date.strftime('%A'),
-                    'Transactions': '; '.join(transactions),
-                    'Daily Change': daily_change,
-                    'Balance': running_balance
-                })
-                
-                dates.append(current_date)
-                balances.append(running_balance)
-                daily_changes.append(daily_change)
-        
-        return forecast_data, dates, balances, daily_changes, pay_dates, ss_dates
-
-    def create_cash_flow_plot(self, num_days=20):
-        """Create matplotlib figure for cash flow"""
-        start_date = datetime.date.today()
-        running_balance = self.current_balance
-        
-        dates = []
-        balances = []
-        daily_changes = []
-        
-        pay_dates = self.get_bi_weekly_pay_dates(start_date, num_days)
-        ss_dates = self.get_social_security_dates(start_date, num_days)
-        major_expense_days = []
-        
-        for i in range(num_days + 1):
-            if i == 0:
-                dates.append(start_date)
-                balances.append(running_balance)
-                daily_changes.append(0)
-            else:
-                current_date = start_date + timedelta(days=i-1)
-                daily_change = 0
-                
-                # Daily expenses
-                daily_change -= self.daily_expenses
-                
-                # Check for bi-weekly pay
-                if current_date in pay_dates:
-                    daily_change += self.bi_weekly_pay
-                
-                # Check for Social Security
-                if current_date in ss_dates:
-                    daily_change += self.social_security
-                
-                # Check for monthly expenses
-                day_of_month = current_date.day
-                daily_expense_total = 0
-                if day_of_month in self.monthly_expenses:
-                    for desc, amount in self.monthly_expenses[day_of_month]:
-                        daily_change -= amount
-                        daily_expense_total += amount
-                
-                if daily_expense_total > 300:
-                    major_expense_days.append(current_date)
-                
-                running_balance += daily_change
-                dates.append(current_date)
-                balances.append(running_balance)
-                daily_changes.append(daily_change)
-        
-        # Create the plot
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-        fig.suptitle('Personal Finance Cash Flow Forecast', fontsize=16, fontweight='bold')
-        
-        # Top plot: Running Balance
-        ax1.plot(dates, balances, linewidth=3, color='darkblue', marker='o', markersize=4)
-        
-        # Color negative balance areas red
-        for i in range(len(dates)):
-            if balances[i] < 0 and i > 0:
-                ax1.axvspan(dates[i-1], dates[i], alpha=0.3, color='red')
-        
-        # Add horizontal line at zero
-        ax1.axhline(y=0, color='red', linestyle='--', alpha=0.7, linewidth=2)
-        
-        # Mark special days
-        for pay_day in pay_dates:
-            if pay_day in dates:
-                idx = dates.index(pay_day)
-                ax1.scatter(pay_day, balances[idx], color='green', s=100, marker='^', 
-                           label='Payday' if pay_day == pay_dates[0] else "", zorder=5)
-        
-        for ss_day in ss_dates:
-            if ss_day in dates:
-                idx = dates.index(ss_day)
-                ax1.scatter(ss_day, balances[idx], color='blue', s=100, marker='s', 
-                           label='Social Security' if ss_day == ss_dates[0] else "", zorder=5)
-        
-        for expense_day in major_expense_days:
-            if expense_day in dates:
-                idx = dates.index(expense_day)
-                ax1.scatter(expense_day, balances[idx], color='orange', s=100, marker='v', 
-                           label='Major Expenses' if expense_day == major_expense_days[0] else "", zorder=5)
-        
-        ax1.set_title('Cash Balance Over Time', fontsize=14)
-        ax1.set_ylabel('Balance ($)', fontsize=12)
-        ax1.grid(True, alpha=0.3)
-        ax1.legend()
-        ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        
-        # Bottom plot: Daily Changes
-        colors = ['green' if x >= 0 else 'red' for x in daily_changes[1:]]
-        ax2.bar(dates[1:], daily_changes[1:], color=colors, alpha=0.7)
-        ax2.axhline(y=0, color='black', linestyle='-', alpha=0.5, linewidth=1)
-        
-        ax2.set_title('Daily Cash Flow Changes', fontsize=14)
-        ax2.set_ylabel('Daily Change ($)', fontsize=12)
-        ax2.set_xlabel('Date', fontsize=12)
-        ax2.grid(True, alpha=0.3)
-        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-        
-        # Format x-axis dates
-        for ax in [ax1, ax2]:
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-            ax.xaxis.set_major_locator(mdates.DayLocator(interval=2))
-            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
-        
-        # Add statistics
-        min_balance = min(balances)
-        max_balance = max(balances)
-        final_balance = balances[-1]
-        days_negative = sum(1 for b in balances if b < 0)
-        
-        stats_text = f'''Statistics:
-Starting: ${balances[0]:,.0f}
-Ending: ${final_balance:,.0f}
-Minimum: ${min_balance:,.0f}
-Maximum: ${max_balance:,.0f}
-Days Negative: {days_negative}'''
-        
-        ax1.text(0.02, 0.98, stats_text, transform=ax1.transAxes, 
-                verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
-        
-        plt.tight_layout()
-        return fig, min_balance, days_negative
-
-    def get_monthly_expenses_summary(self):
-        """Get summary of monthly expenses"""
-        expenses_summary = []
-        total_monthly = 0
-        
-        for day in sorted(self.monthly_expenses.keys()):
-            day_total = 0
-            day_expenses = []
-            for desc, amount in self.monthly_expenses[day]:
-                day_expenses.append({'Description': desc, 'Amount': amount})
-                day_total += amount
-                total_monthly += amount
-            
-            expenses_summary.append({
-                'Day': day,
-                'Expenses': day_expenses,
-                'Day Total': day_total
-            })
-        
-        return expenses_summary, total_monthly
-
-# Initialize the forecaster
-if 'forecaster' not in st.session_state:
-    st.session_state.forecaster = PersonalFinanceForecaster()
+    The snapshot covers SNAPSHOT_DAYS whatever horizon this session shows,
+    so a short forecast never replaces a longer snapshot.
+    """
+    result = forecaster.compute_forecast(max(num_days, reconciliation.SNAPSHOT_DAYS))
+    try:
+        reconciliation.ReconciliationStore().record_forecast(result, forecaster.daily_expenses)
+    except (OSError, ValueError) as e:
+        # ValueError covers a corrupt meta.json
+        st.warning(f"⚠️ Could not save the forecast snapshot: {e}")
+    return result.head(num_days)
 
 def main():
     st.set_page_config(
@@ -354,7 +77,12 @@ def main():
     st.title("💰 Personal Finance Cash Flow Forecaster")
     st.markdown("---")
     
-    forecaster = st.session_state.forecaster
+    shared = get_shared_forecaster()
+    # I/O errors from this session's own loads and saves; the forecaster is shared
+    errors = st.session_state.setdefault('forecaster_errors', [])
+    forecaster = shared.get(errors)
+    while errors:
+        st.error(errors.pop(0))
     
     # Sidebar for settings
     with st.sidebar:
@@ -391,9 +119,11 @@ def main():
             try:
                 uploaded_data = json.load(uploaded_file)
                 if st.button("🔄 Restore from File"):
-                    forecaster.current_balance = uploaded_data.get('current_balance', 0.0)
-                    forecaster.daily_expenses = uploaded_data.get('daily_expenses', 100.0)
-                    forecaster.save_balance()
+                    with shared.update(errors):
+                        forecaster.restore_balance(
+                            uploaded_data.get('current_balance', 0.0),
+                            uploaded_data.get('daily_expenses', 100.0)
+                        )
                     st.success(f"✅ Data restored! Balance: ${forecaster.current_balance:,.2f}")
                     st.rerun()
                     
@@ -405,6 +135,24 @@ def main():
             except Exception as e:
                 st.error(f"❌ Error reading file: {str(e)}")
         
+        # Bank statement import into the local transaction store
+        with st.expander("🏦 Import Statements"):
+            statements = st.file_uploader("Bank CSV/OFX exports", type=['csv', 'ofx', 'qfx'],
+                                          accept_multiple_files=True, key="statement_files")
+            statement_account = st.text_input("Account", "",
+                                              help="Defaults to the OFX account id or the file name")
+            if statements and st.button("📥 Import Transactions"):
+                store = statement_import.TransactionStore()
+                for statement in statements:
+                    try:
+                        stats = statement_import.import_upload(store, statement.getvalue(), statement.name,
+                                                               statement_account or None)
+                        st.success(f"{statement.name}: {stats['added']:,} added, "
+                                   f"{stats['duplicates']:,} duplicates, {stats['skipped']:,} skipped")
+                    except ValueError as e:
+                        st.error(f"❌ {statement.name}: {e}")
+                st.caption(f"{len(store):,} transactions stored")
+        
         st.markdown("---")
         
         # Current balance display and update
@@ -419,7 +167,8 @@ def main():
         )
         
         if st.button("💾 Save Balance"):
-            forecaster.set_current_balance(new_balance)
+            with shared.update(errors):
+                forecaster.set_current_balance(new_balance)
             st.success(f"Balance updated to ${new_balance:,.2f}")
             st.rerun()
         
@@ -437,7 +186,8 @@ def main():
         
         if st.button("➕➖ Apply Adjustment"):
             if adjustment_amount != 0:
-                message = forecaster.update_balance(adjustment_amount, adjustment_desc)
+                with shared.update(errors):
+                    message = forecaster.update_balance(adjustment_amount, adjustment_desc)
                 st.success(message)
                 st.rerun()
         
@@ -454,30 +204,52 @@ def main():
         )
         
         if st.button("💸 Update Daily Expenses"):
-            forecaster.daily_expenses = new_daily_expenses
+            with shared.update(errors):
+                forecaster.daily_expenses = new_daily_expenses
             st.success(f"Daily expenses updated to ${new_daily_expenses:.2f}")
             st.rerun()
     
+    # Compute the forecast once per input set, for the longest horizon any tab
+    # asks for (widget values from the last rerun); each tab takes its prefix
+    caches = get_forecast_caches()
+    forecast_horizon = max(st.session_state.get('forecast_days', DEFAULT_FORECAST_DAYS),
+                           st.session_state.get('chart_days', DEFAULT_FORECAST_DAYS))
+    # The lock keeps another session's update from landing between key and compute
+    with shared.lock:
+        forecast_key = forecaster.forecast_key(forecast_horizon)
+        forecast = caches['forecast'].get_or_compute(
+            forecast_key, lambda: compute_and_record(forecaster, forecast_horizon)
+        )
+    
     # Main content tabs
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Forecast", "📈 Cash Flow Chart", "📋 Monthly Expenses", "ℹ️ About"])
     
     with tab1:
         st.header("📊 Cash Flow Forecast")
         
-        # Forecast period selector
-        col1, col2 = st.columns([1, 3])
+        # Forecast horizon and table granularity
+        col1, col2, col3 = st.columns([1, 1, 2])
         with col1:
-            forecast_days = st.selectbox("Forecast Period", [7, 14, 20, 30], index=2)
-        
-        # Generate forecast
-        forecast_data, dates, balances, daily_changes, pay_dates, ss_dates = forecaster.generate_forecast_data(forecast_days)
+            forecast_days = st.number_input("Forecast Period (Days)", min_value=1,
+                                            max_value=MAX_FORECAST_DAYS, value=DEFAULT_FORECAST_DAYS,
+                                            step=1, key="forecast_days")
+        with col2:
+            granularity = GRANULARITIES[st.selectbox("Table Granularity", list(GRANULARITIES),
+                                                     key="table_granularity")]
+        with col3:
+            balance_floor = st.number_input("Balance Floor ($)", value=DEFAULT_BALANCE_FLOOR, step=100.0,
+                                            format="%.2f", key="balance_floor",
+                                            help="Warn when the projected balance drops below this amount")
+        granularity = granularity or forecast_engine.granularity_for(forecast_days)
+        
+        result = forecast.head(forecast_days)
         
         # Summary metrics
-        if forecast_data:
-            final_balance = forecast_data[-1]['Balance']
+        if result.num_days:
+            final_balance = result.final_balance
             total_change = final_balance - forecaster.current_balance
-            min_balance = min([d['Balance'] for d in forecast_data])
-            days_negative = sum(1 for d in forecast_data if d['Balance'] < 0)
+            min_balance = result.min_balance
+            days_negative = result.days_negative
             
             col1, col2, col3, col4 = st.columns(4)
             
@@ -490,32 +262,213 @@ def main():
             with col4:
                 st.metric("Days Negative", days_negative)
             
-            # Warnings
+            # Warnings; crossings come from the prefix-minimum index, not a rescan
+            below_floor = result.first_date_below(balance_floor)
             if min_balance < 0:
-                st.error(f"⚠️ WARNING: Balance goes negative! Lowest point: ${min_balance:,.2f}")
-            elif final_balance < 500:
-                st.warning("⚠️ CAUTION: Low balance projected")
+                st.error(f"⚠️ WARNING: Balance goes negative on {result.first_date_below(0.0):%m/%d/%Y}! "
+                         f"Lowest point: ${min_balance:,.2f}")
+            elif below_floor is not None:
+                st.warning(f"⚠️ CAUTION: Balance drops below ${balance_floor:,.2f} on {below_floor:%m/%d/%Y} "
+                           f"({result.runway_days(balance_floor)} days of runway)")
             else:
                 st.success("✅ Balance looks healthy")
             
-            # Forecast table
-            st.subheader("Daily Breakdown")
-            df = pd.DataFrame(forecast_data)
-            df['Date'] = df['Date'].apply(lambda x: x.strftime('%Y-%m-%d'))
-            df['Daily Change'] = df['Daily Change'].apply(lambda x: f"${x:+,.2f}")
-            df['Balance'] = df['Balance'].apply(lambda x: f"${x:,.2f}")
+            # Forecast table; only the visible page is built and formatting
+            # is left to the column config
+            if granularity == 'day':
+                st.subheader("Daily Breakdown")
+                start_row, stop_row = paged_rows(result.num_days, "Days")
+                with perf_timing.span('table'):
+                    df = result.to_frame(start_row, stop_row)
+                    st.dataframe(df, use_container_width=True, hide_index=True, column_config={
+                        'Date': st.column_config.DateColumn("Date", format="YYYY-MM-DD"),
+                        'Daily Change': st.column_config.NumberColumn("Daily Change", format="$%+.2f"),
+                        'Balance': st.column_config.NumberColumn("Balance", format="$%.2f")
+                    })
+            else:
+                rollup = result.rollup(granularity)
+                st.subheader("Weekly Breakdown" if granularity == 'week' else "Monthly Breakdown")
+                start_row, stop_row = paged_rows(rollup.num_periods,
+                                                 "Weeks" if granularity == 'week' else "Months")
+                with perf_timing.span('table'):
+                    df = rollup.to_frame(start_row, stop_row)
+                    column_config = {
+                        column: st.column_config.NumberColumn(column, format="$%.2f")
+                        for column in ['Bills', 'Min Balance', 'Max Balance', 'Ending Balance']
+                    }
+                    column_config['Net Flow'] = st.column_config.NumberColumn("Net Flow", format="$%+.2f")
+                    column_config[df.columns[0]] = st.column_config.DateColumn(
+                        df.columns[0], format="YYYY-MM-DD" if granularity == 'week' else "MMM YYYY"
+                    )
+                    st.dataframe(df, use_container_width=True, hide_index=True, column_config=column_config)
+            
+            # Range-minimum queries: the index is built once per forecast, so
+            # moving the range never rescans the balances
+            with st.expander("🔍 Low Points"):
+                last_date = result.start_date + datetime.timedelta(days=result.num_days - 1)
+                selected = st.date_input("Date Range", value=(result.start_date, last_date),
+                                         min_value=result.start_date, max_value=last_date,
+                                         key="low_point_range")
+                if isinstance(selected, (tuple, list)) and len(selected) == 2:
+                    low_date, low_balance = result.lowest_between(selected[0], selected[1])
+                    st.metric(f"Lowest Balance {selected[0]:%m/%d/%Y}–{selected[1]:%m/%d/%Y}",
+                              f"${low_balance:,.2f}", f"on {low_date:%a %m/%d/%Y}", delta_color="off")
+                
+                intervals = result.intervals_below(balance_floor)
+                if intervals:
+                    st.caption(f"Stretches below the ${balance_floor:,.2f} floor")
+                    first, last = paged_rows(len(intervals), "Stretches", key="below_floor")
+                    st.dataframe(pd.DataFrame(intervals[first:last], columns=['From', 'To']),
+                                 use_container_width=True, hide_index=True, column_config={
+                                     'From': st.column_config.DateColumn("From", format="YYYY-MM-DD"),
+                                     'To': st.column_config.DateColumn("To", format="YYYY-MM-DD")
+                                 })
+                
+                st.caption("Lowest balance in each pay period")
+                starts, ends, lows, floors = result.pay_period_floors()
+                start_day = np.datetime64(result.start_date, 'D')
+                period_start, period_end = paged_rows(len(starts), "Pay periods", key="pay_period")
+                window = slice(period_start, period_end)
+                st.dataframe(pd.DataFrame({
+                    'From': start_day + starts[window],
+                    'To': start_day + ends[window],
+                    'Lowest On': start_day + lows[window],
+                    'Lowest Balance': floors[window]
+                }), use_container_width=True, hide_index=True, column_config={
+                    'From': st.column_config.DateColumn("From", format="YYYY-MM-DD"),
+                    'To': st.column_config.DateColumn("To", format="YYYY-MM-DD"),
+                    'Lowest On': st.column_config.DateColumn("Lowest On", format="YYYY-MM-DD"),
+                    'Lowest Balance': st.column_config.NumberColumn("Lowest Balance", format="$%.2f")
+                })
+            
+            # Past forecasts against the balances actually entered since
+            with st.expander("📐 Forecast Accuracy"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    accuracy_lead = st.selectbox(
+                        "Compare Forecasts Made", [None, 1, 7, 30],
+                        format_func=lambda lead: "The day before" if lead is None else f"{lead} days ahead"
+                    )
+                with col2:
+                    accuracy_months = st.number_input("Months of History", min_value=1, max_value=60, value=12)
+                if st.button("📐 Reconcile"):
+                    try:
+                        store = reconciliation.ReconciliationStore()
+                    except (OSError, ValueError) as e:
+                        st.error(f"❌ Could not open the reconciliation store: {e}")
+                    else:
+                        store.import_journal(forecaster.journal.history())
+                        last_day = forecast_engine.date_to_day(datetime.date.today())
+                        first_day = last_day - int(accuracy_months * 30.44)
+                        transactions = statement_import.TransactionStore()
+                        bills = [charge.merchant for charge in recurring_detect.detect_store(transactions)
+                                 if charge.confidence >= recurring_detect.MIN_CONFIDENCE]
+                        st.session_state.reconciliation = (
+                            store.daily_variance(first_day, last_day, accuracy_lead),
+                            store.category_variance(transactions.transactions(first_day, last_day),
+                                                    first_day, last_day, bills, accuracy_lead)
+                        )
+                if 'reconciliation' in st.session_state:
+                    daily, monthly = st.session_state.reconciliation
+                    summary = reconciliation.summarize(daily)
+                    if not summary['days']:
+                        st.info("No days yet with both a stored forecast and an entered balance.")
+                    else:
+                        col1, col2, col3 = st.columns(3)
+                        col1.metric("Days Reconciled", summary['days'])
+                        col2.metric("Average Miss", f"${summary['mean_abs_error']:,.2f}")
+                        col3.metric("Bias", f"${summary['bias']:+,.2f}",
+                                    help="Actual minus forecast; negative means the forecast was too optimistic")
+                        st.line_chart(pd.DataFrame({
+                            'Forecast': daily['forecast'],
+                            'Actual': daily['actual']
+                        }, index=np.datetime64('1970-01-01', 'D') + daily['day']))
+                        st.dataframe(pd.DataFrame({
+                            'Month': monthly['month'].astype('M8[D]'),
+                            **{f"{name.title()} {side.title()}": monthly[f'{name}_{side}']
+                               for name in reconciliation.CATEGORIES for side in ('forecast', 'actual', 'variance')}
+                        }), use_container_width=True, hide_index=True, column_config={
+                            'Month': st.column_config.DateColumn("Month", format="YYYY-MM"),
+                            **{f"{name.title()} {side.title()}": st.column_config.NumberColumn(format="$%.2f")
+                               for name in reconciliation.CATEGORIES for side in ('forecast', 'actual', 'variance')}
+                        })
+            
+            # Forecast exports, written from the engine arrays in batches
+            with st.expander("📤 Export Forecast"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    export_table = st.selectbox("Table", forecast_export.TABLES,
+                                                format_func=lambda table: table.title())
+                with col2:
+                    export_format = st.selectbox("Format", forecast_export.FORMATS,
+                                                 format_func=lambda fmt: {'arrow': 'Arrow IPC'}.get(fmt, fmt.upper()))
+                try:
+                    export_data = caches['export'].get_or_compute(
+                        (forecast_key, forecast_days, export_table, export_format),
+                        lambda: forecast_export.to_bytes(result, export_format, export_table)
+                    )
+                    st.download_button(
+                        label=f"📥 Download {export_table.title()} {export_format.upper()}",
+                        data=export_data,
+                        file_name=f"forecast_{export_table}_{result.start_date:%Y%m%d}.{export_format}",
+                        mime=forecast_export.MIME_TYPES[export_format]
+                    )
+                except ImportError as e:
+                    st.info(str(e))
             
-            st.dataframe(df, use_container_width=True)
+            # Monte Carlo spending simulation
+            with st.expander("🎲 Spending Simulation"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    # Longer horizons offer fewer paths, to keep a run interactive
+                    path_choices = [paths for paths in [1000, 10000, 50000, 100000]
+                                    if paths <= simulation.max_paths(forecast_days)]
+                    sim_paths = st.selectbox("Simulated Paths", path_choices, index=min(1, len(path_choices) - 1))
+                    sim_distribution = st.selectbox("Spending Distribution", simulation.DISTRIBUTIONS, index=1)
+                with col2:
+                    sim_std = st.number_input("Daily Spending Std Dev", min_value=0.0, value=30.0,
+                                              step=5.0, format="%.2f")
+                with col3:
+                    sim_late = st.slider("Late Payday Chance", 0.0, 0.5, 0.0, 0.05)
+                    sim_late_days = st.number_input("Max Days Late", min_value=1, max_value=10, value=3)
+                
+                sim_key = (forecast_key, forecast_days, sim_paths, sim_distribution, sim_std,
+                           sim_late, int(sim_late_days))
+                if st.button("🎲 Run Simulation"):
+                    with st.spinner("Simulating spending paths..."):
+                        caches['simulation'].put(sim_key, simulation.simulate(
+                            result, forecaster.daily_expenses, sim_paths, sim_distribution, sim_std,
+                            sim_late, int(sim_late_days), seed=0
+                        ))
+                
+                sim = caches['simulation'].get(sim_key) if sim_key in caches['simulation'] else None
+                if sim is not None:
+                    st.metric("Chance of Going Negative", f"{sim.probability_ever_negative:.1%}")
+                    bands = pd.DataFrame({
+                        '5th percentile': sim.percentiles[5],
+                        'Median': sim.percentiles[50],
+                        '95th percentile': sim.percentiles[95],
+                        'Forecast': result.balance
+                    }, index=pd.to_datetime(result.dates))
+                    st.line_chart(bands)
+                    st.caption("Probability of a negative balance by day")
+                    st.area_chart(pd.DataFrame({'Overdraft Probability': sim.overdraft_probability},
+                                               index=pd.to_datetime(result.dates)))
     
     with tab2:
         st.header("📈 Cash Flow Chart")
         
-        chart_days = st.selectbox("Chart Period (Days)", [7, 14, 20, 30], index=2, key="chart_days")
+        chart_days = st.number_input("Chart Period (Days)", min_value=1, max_value=MAX_FORECAST_DAYS,
+                                     value=DEFAULT_FORECAST_DAYS, step=1, key="chart_days")
+        if forecast_engine.granularity_for(chart_days) != 'day':
+            st.caption("Long horizons show net cash flow per "
+                       f"{forecast_engine.granularity_for(chart_days)} in the lower panel.")
         
         if st.button("🔄 Generate Chart"):
             with st.spinner("Generating cash flow chart..."):
-                fig, min_balance, days_negative = forecaster.create_cash_flow_plot(chart_days)
-                st.pyplot(fig)
+                chart_result = forecast.head(chart_days)
+                st.image(caches['chart'].get_or_render(chart_result), use_container_width=True)
+                min_balance = min(chart_result.opening_balance, chart_result.min_balance)
                 
                 if min_balance < 0:
                     st.error(f"⚠️ Chart shows negative balance! Minimum: ${min_balance:,.2f}")
@@ -523,7 +476,13 @@ def main():
     with tab3:
         st.header("📋 Monthly Recurring Expenses")
         
-        expenses_summary, total_monthly = forecaster.get_monthly_expenses_summary()
+        # Other sessions edit the same schedule; read it under the shared lock
+        with shared.lock:
+            expenses_summary, total_monthly = caches['summary'].get_or_compute(
+                forecaster.schedule_fingerprint(), forecaster.get_monthly_expenses_summary
+            )
+            expense_choices = [(day, desc) for day in sorted(forecaster.monthly_expenses)
+                               for desc, _ in forecaster.monthly_expenses[day]]
         
         st.metric("Total Monthly Expenses", f"${total_monthly:,.2f}")
         
@@ -547,7 +506,81 @@ def main():
             with st.expander(f"Day {day_info['Day']} - Total: ${day_info['Day Total']:.2f}"):
                 for expense in day_info['Expenses']:
                     st.write(f"• {expense['Description']}: ${expense['Amount']:.2f}")
-    
+
+        # Edit the schedule; the forecast updates only on the affected days
+        st.subheader("Edit Monthly Expenses")
+        col1, col2 = st.columns(2)
+        with col1:
+            new_expense_day = st.number_input("Day of Month", min_value=1, max_value=31, value=1, step=1)
+            new_expense_desc = st.text_input("Expense Description", "")
+            new_expense_amount = st.number_input("Expense Amount", min_value=0.0, value=0.0, step=5.0, format="%.2f")
+            if st.button("➕ Add Expense"):
+                if new_expense_desc and new_expense_amount > 0:
+                    with shared.update(errors):
+                        forecaster.add_monthly_expense(int(new_expense_day), new_expense_desc, new_expense_amount)
+                    st.success(f"Added {new_expense_desc} on day {int(new_expense_day)}")
+                    st.rerun()
+                else:
+                    st.error("❌ Enter a description and a positive amount.")
+        with col2:
+            expense_to_remove = st.selectbox(
+                "Remove Expense", expense_choices,
+                format_func=lambda choice: f"Day {choice[0]} - {choice[1]}"
+            )
+            if st.button("🗑️ Remove Expense") and expense_to_remove is not None:
+                try:
+                    with shared.update(errors):
+                        forecaster.remove_monthly_expense(*expense_to_remove)
+                except KeyError:
+                    # Another session removed it first; shown after the rerun
+                    errors.append(f"{expense_to_remove[1]} was already removed from day {expense_to_remove[0]}")
+                else:
+                    st.success(f"Removed {expense_to_remove[1]} from day {expense_to_remove[0]}")
+                st.rerun()
+
+        # Recurring charges found in imported statements
+        with st.expander("🔎 Detect From Transactions"):
+            store = statement_import.TransactionStore()
+            if not len(store):
+                st.info("Import bank statements from the sidebar to detect recurring charges.")
+            else:
+                min_confidence = st.slider("Minimum Confidence", 0.0, 1.0, recurring_detect.MIN_CONFIDENCE, 0.05)
+                if st.button("🔎 Scan Transactions"):
+                    st.session_state.detected_charges = recurring_detect.detect_store(store)
+                charges = [charge for charge in st.session_state.get('detected_charges', [])
+                           if charge.active and charge.confidence >= min_confidence]
+                if charges:
+                    st.dataframe(pd.DataFrame([{
+                        'Name': charge.name,
+                        'Pattern': charge.pattern,
+                        'Day': charge.day,
+                        'Amount': charge.amount,
+                        'Last Seen': charge.last_date,
+                        'Occurrences': charge.occurrences,
+                        'Confidence': charge.confidence,
+                    } for charge in charges]), use_container_width=True, column_config={
+                        'Amount': st.column_config.NumberColumn(format="$%.2f"),
+                        'Confidence': st.column_config.ProgressColumn(min_value=0.0, max_value=1.0),
+                    })
+                    if st.button("➕ Add Detected Bills"):
+                        added = 0
+                        with shared.update(errors):
+                            for day, bills in recurring_detect.proposed_monthly_expenses(charges, min_confidence).items():
+                                existing = {desc for desc, _ in forecaster.monthly_expenses.get(day, [])}
+                                for desc, amount in bills:
+                                    if desc not in existing:
+                                        forecaster.add_monthly_expense(day, desc, amount)
+                                        added += 1
+                            existing = {rule.key() for rule in forecaster.extra_rules}
+                            for rule in recurring_detect.proposed_rules(charges, min_confidence):
+                                if rule.key() not in existing:
+                                    forecaster.add_rule(rule)
+                                    added += 1
+                        st.success(f"Added {added} detected bills")
+                        st.rerun()
+                elif 'detected_charges' in st.session_state:
+                    st.info("No recurring charges above that confidence.")
+
     with tab4:
         st.header("ℹ️ About This App")
         
@@ -585,6 +618,43 @@ def main():
         
         **💡 Pro Tip:** Always download your balance file before closing the app, especially on cloud hosting!
         """.format(forecaster.bi_weekly_pay, forecaster.social_security, forecaster.daily_expenses))
+    
+    # Cache statistics, shown last so they include this rerun's lookups
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("🗄️ Cache Stats"):
+            for name, cache in caches.items():
+                stats = cache.stats()
+                if 'maxsize' in stats:
+                    size = f"{stats['size']}/{stats['maxsize']} entries"
+                else:
+                    size = f"{stats['size']} images, {stats['bytes'] / 1024:,.0f} KiB in memory"
+                st.write(f"**{name.title()}**: {stats['hits']} hits / {stats['misses']} misses ({size})")
+            shared_stats = shared.stats()
+            st.write(f"**Shared State**: version {shared_stats['version']}, "
+                     f"{shared_stats['reloads']} reloads from disk")
+        
+        # Stage timings; recording is off unless enabled here or by FORECAST_TIMING=1
+        with st.expander("⏱️ Performance"):
+            perf_timing.enable(st.checkbox("Record stage timings", value=perf_timing.is_enabled()))
+            timings = perf_timing.stats()
+            if timings:
+                st.dataframe(pd.DataFrame.from_dict(timings, orient='index'), use_container_width=True,
+                             column_config={
+                                 'count': st.column_config.NumberColumn("Runs"),
+                                 'last_ms': st.column_config.NumberColumn("Last (ms)", format="%.1f"),
+                                 'p50_ms': st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+                                 'p95_ms': st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+                                 'max_ms': st.column_config.NumberColumn("Max (ms)", format="%.1f")
+                             })
+                st.download_button("📥 Download Timings (JSONL)", perf_timing.to_jsonl(),
+                                   file_name="forecast_timings.jsonl", mime="application/x-ndjson")
+                if st.button("Reset Timings"):
+                    perf_timing.reset()
+                    st.rerun()
+            elif perf_timing.is_enabled():
+                st.caption("Timings appear after the next rerun.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with perf_timing.span('rerun'):
+        main()
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""One forecaster per process, shared by every session of the app.
+
+Sessions used to build their own PersonalFinanceForecaster, each loading
+the balance file and compiling the schedule, and never saw each other's
+changes. SharedForecaster holds a single instance instead; the app keeps
+it in st.cache_resource, so memory does not grow with the number of
+sessions and a new session starts without reading the balance file.
+
+Changes made through update() are visible to every session on its next
+rerun. Changes made by another process (a CLI, a second server) are
+noticed by stat-ing the balance snapshot and journal on each get(): when
+their mtime or size differs from the last one seen, the balance is
+reloaded. version increases on every change either way.
+"""
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+from finance_forecaster import PersonalFinanceForecaster
+
+
+class SharedForecaster:
+    """A PersonalFinanceForecaster shared across sessions, reloaded when its files change"""
+
+    def __init__(self, balance_file=None):
+        # Re-entrant: an update may compute a forecast, which also takes the lock
+        self.lock = threading.RLock()
+        self.forecaster = PersonalFinanceForecaster(balance_file)
+        self.version = 0
+        self.reloads = 0
+        self._signature = self._stat()
+
+    def _paths(self):
+        journal = getattr(self.forecaster, 'journal', None)
+        return (self.forecaster.balance_file, journal.journal_path if journal else None)
+
+    def _stat(self):
+        """(mtime_ns, size) of the balance snapshot and journal; None for a missing file"""
+        signature = []
+        for path in self._paths():
+            try:
+                stat = os.stat(path) if path else None
+            except FileNotFoundError:
+                stat = None
+            signature.append((stat.st_mtime_ns, stat.st_size) if stat else None)
+        return tuple(signature)
+
+    def get(self, errors=None):
+        """The shared forecaster, with the balance reloaded first if another process changed it.
+
+        errors, when given, is a list that receives any error the reload reported.
+        """
+        if self._stat() != self._signature:
+            with self.lock:
+                signature = self._stat()
+                if signature != self._signature:
+                    self.forecaster.current_balance = self.forecaster.load_balance()
+                    self._signature = self._stat()
+                    self.version += 1
+                    self.reloads += 1
+                    self._collect_errors(errors)
+        return self.forecaster
+
+    @contextmanager
+    def update(self, errors=None):
+        """Hold the lock while changing the forecaster.
+
+        Files written inside the block are recorded as seen, so this
+        process's own saves do not trigger a reload. errors, when given,
+        is a list that receives the I/O errors reported inside the block,
+        so they reach the session that caused them.
+        """
+        with self.lock:
+            journal = getattr(self.forecaster, 'journal', None)
+            # Holding the journal's file lock until the signature is taken
+            # keeps another process's write from being recorded as seen
+            with journal.lock if journal else nullcontext():
+                try:
+                    yield self.forecaster
+                finally:
+                    self._collect_errors(errors)
+                    self._signature = self._stat()
+                    self.version += 1
+
+    def _collect_errors(self, errors):
+        # Called with the lock held, so only errors of the current holder are
+        # pending; they are already logged, so without a list they are dropped
+        reported = self.forecaster.pop_errors()
+        if errors is not None:
+            errors.extend(reported)
+
+    def stats(self):
+        return {'version': self.version, 'reloads': self.reloads}
@@ -0,0 +1,141 @@
+"""Monte Carlo simulation of daily spending around a deterministic forecast"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DISTRIBUTIONS = ('normal', 'lognormal', 'gamma')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Paths drawn per matrix block, at most; long horizons get fewer so a block
+# stays near CHUNK_CELLS path-days (about 30 bytes each at peak)
+CHUNK_PATHS = 5000
+CHUNK_CELLS = 2_000_000
+# Percentile bands come from this many paths, at most, and from no more than
+# BAND_CELLS path-days (float32); overdraft odds use all of them
+BAND_PATHS = 20000
+BAND_CELLS = 10_000_000
+# Largest run accepted, in paths x days (about 3 seconds on one core)
+MAX_PATH_DAYS = 50_000_000
+# Runs with at least this many paths are split across processes by default
+PARALLEL_MIN_PATHS = 50000
+
+
+def max_paths(num_days):
+    """Most paths simulate() accepts for a horizon"""
+    return MAX_PATH_DAYS // max(num_days, 1)
+
+
+def _block_paths(cells, num_days, most):
+    return max(1, min(most, cells // max(num_days, 1)))
+
+
+class SimulationResult:
+    """Per-day overdraft probability and percentile balance bands"""
+
+    def __init__(self, n_paths, overdraft_probability, probability_ever_negative, percentiles):
+        self.n_paths = n_paths
+        self.overdraft_probability = overdraft_probability
+        self.probability_ever_negative = probability_ever_negative
+        self.percentiles = percentiles
+
+    @property
+    def num_days(self):
+        return len(self.overdraft_probability)
+
+
+def draw_spending(rng, distribution, mean, std, shape):
+    """Non-negative daily spending with the given mean and standard deviation"""
+    if std <= 0 or mean <= 0:
+        return np.full(shape, max(mean, 0.0))
+    if distribution == 'normal':
+        return np.maximum(rng.normal(mean, std, shape), 0.0)
+    if distribution == 'lognormal':
+        sigma2 = np.log1p((std / mean) ** 2)
+        return rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), shape)
+    if distribution == 'gamma':
+        shape_k = (mean / std) ** 2
+        return rng.gamma(shape_k, std ** 2 / mean, shape)
+    raise ValueError(f"Unknown spending distribution: {distribution}")
+
+
+def _simulate_chunk(args):
+    (seed, n_paths, keep_paths, opening_balance, scheduled, pay_offsets, pay_amounts,
+     distribution, mean, std, late_pay_probability, max_late_days) = args
+    rng = np.random.default_rng(seed)
+    num_days = len(scheduled)
+
+    flows = scheduled - draw_spending(rng, distribution, mean, std, (n_paths, num_days))
+
+    if late_pay_probability > 0 and len(pay_offsets):
+        late = rng.random((n_paths, len(pay_offsets))) < late_pay_probability
+        delay = rng.integers(1, max_late_days + 1, size=late.shape)
+        paths, which = np.nonzero(late)
+        moved_to = pay_offsets[which] + delay[paths, which]
+        flows[paths, pay_offsets[which]] -= pay_amounts[which]
+        # Pay delayed past the horizon simply never arrives within it
+        inside = moved_to < num_days
+        np.add.at(flows, (paths[inside], moved_to[inside]), pay_amounts[which][inside])
+
+    balances = opening_balance + np.cumsum(flows, axis=1)
+    negative = balances < 0
+    return negative.sum(axis=0), int(negative.any(axis=1).sum()), balances[:keep_paths].astype(np.float32)
+
+
+def simulate(result, daily_expenses, n_paths=10000, distribution='lognormal', spending_std=30.0,
+             late_pay_probability=0.0, max_late_days=3, seed=None, workers=None):
+    """Simulate n_paths of the forecast with random daily spending.
+
+    The scheduled flows (pay, Social Security, bills) come from the
+    deterministic ForecastResult; daily spending is redrawn per path and
+    day with mean daily_expenses. With late_pay_probability each payday
+    may slip by 1..max_late_days days. Paths are simulated as matrix
+    blocks; workers > 1 (or None for large runs) spreads the blocks over a
+    process pool. Runs over MAX_PATH_DAYS path-days raise ValueError.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown spending distribution: {distribution}")
+    num_days = result.num_days
+    if n_paths > max_paths(num_days):
+        raise ValueError(f"{n_paths:,} paths over {num_days:,} days is too large; "
+                         f"at most {max_paths(num_days):,} paths for this horizon")
+    scheduled = result.daily_change + daily_expenses
+    calendar = result.calendar
+    is_pay = calendar.schedule.categories[calendar.occ_rule] == 'pay'
+    pay_offsets, slot = np.unique(calendar.occ_offset[is_pay], return_inverse=True)
+    pay_amounts = np.bincount(slot, weights=calendar.schedule.amounts[calendar.occ_rule[is_pay]],
+                              minlength=len(pay_offsets))
+
+    chunk_paths = _block_paths(CHUNK_CELLS, num_days, CHUNK_PATHS)
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    band_left = _block_paths(BAND_CELLS, num_days, BAND_PATHS)
+    tasks = []
+    for size, chunk_seed in zip(sizes, seeds):
+        keep = min(size, band_left)
+        band_left -= keep
+        tasks.append((chunk_seed, size, keep, result.opening_balance, scheduled, pay_offsets, pay_amounts,
+                      distribution, daily_expenses, spending_std, late_pay_probability, max_late_days))
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if n_paths >= PARALLEL_MIN_PATHS else 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            chunks = list(pool.map(_simulate_chunk, tasks))
+    else:
+        chunks = [_simulate_chunk(task) for task in tasks]
+
+    negative_days = np.zeros(num_days)
+    ever_negative = 0
+    for chunk_negative, chunk_ever, _ in chunks:
+        negative_days += chunk_negative
+        ever_negative += chunk_ever
+    band_sample = np.concatenate([chunk[2] for chunk in chunks if len(chunk[2])])
+    bands = np.percentile(band_sample, PERCENTILES, axis=0) if num_days else np.empty((len(PERCENTILES), 0))
+
+    return SimulationResult(
+        n_paths,
+        negative_days / n_paths,
+        ever_negative / n_paths,
+        {p: bands[i] for i, p in enumerate(PERCENTILES)}
+    )
@@ -0,0 +1,501 @@
+"""Stream bank CSV/OFX exports into a local columnar transaction store.
+
+    python statement_import.py exports/*.csv exports/*.ofx --store transactions
+    python statement_import.py checking.csv --account checking
+
+Files are read in chunks of CHUNK_ROWS rows, so memory stays bounded by
+the chunk plus the dedupe index. Each row is normalized: the date
+becomes days since 1970-01-01, the amount becomes signed cents, and the
+description becomes a merchant id in the store's merchant dictionary.
+
+A transaction's key hashes its account, day, cents, merchant and an
+ordinal among identical rows in the same file. OFX rows use FITID
+instead. Overlapping exports therefore map the same transactions to the
+same keys, while two genuine identical purchases on one day stay
+distinct. Keys already in the store's sorted hash index are skipped.
+
+The store is a directory of raw little-endian column files (read back
+with np.memmap) plus meta.json. meta.json records the committed row
+count, the merchant and account dictionaries, and the column dtypes.
+Opening a store only reads meta.json. Imports run inside writing(), which
+holds store.lock from the first append to the commit; rows an interrupted
+import left past the committed count are dropped there, under the lock.
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from balance_journal import FileLock, atomic_write_json
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+CHUNK_ROWS = 100_000
+STORE_DIR = 'transactions'
+
+COLUMNS = {
+    'day': np.dtype('<i4'),
+    'amount_cents': np.dtype('<i8'),
+    'merchant': np.dtype('<i4'),
+    'account': np.dtype('<i2'),
+    'key': np.dtype('<u8'),
+}
+
+# Header names recognised in bank CSV exports (lower-cased)
+DATE_HEADERS = ('date', 'transaction date', 'posted date', 'posting date', 'trans. date')
+AMOUNT_HEADERS = ('amount', 'transaction amount')
+DEBIT_HEADERS = ('debit', 'withdrawal', 'withdrawals')
+CREDIT_HEADERS = ('credit', 'deposit', 'deposits')
+DESCRIPTION_HEADERS = ('description', 'payee', 'merchant', 'name', 'memo', 'details')
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%d-%b-%Y', '%Y%m%d')
+
+# Card-processor noise stripped from descriptions before they become merchants
+_MERCHANT_NOISE = re.compile(
+    r"^(POS |DEBIT CARD PURCHASE |CHECKCARD |PURCHASE AUTHORIZED ON \d\d/\d\d |ACH |SQ \*|TST\* |PAYPAL \*)"
+    r"|#\s*\d+|\b\d{4,}\b|\*[\w\d]+|\s+X{2,}\d*"
+)
+_SPACES = re.compile(r'\s+')
+_OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+# Cap on the per-import description and date memos
+MEMO_LIMIT = 200_000
+# Memo entry for strings that failed to parse
+_INVALID = object()
+
+
+def _mix(x):
+    """splitmix64 finalizer over a uint64 array"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _combine(*columns):
+    h = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        h = _mix(h ^ column.astype(np.int64).view(np.uint64))
+    return h
+
+
+def normalize_merchant(description):
+    """Upper-cased description with card-processor prefixes, store numbers and references removed"""
+    text = _MERCHANT_NOISE.sub(' ', description.upper())
+    return _SPACES.sub(' ', text).strip(' -*') or description.strip().upper()
+
+
+def parse_amount(text):
+    """'$1,234.56', '(12.00)', '-5' -> signed cents; '' -> None"""
+    text = text.strip().replace('$', '').replace(',', '')
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+    cents = int(round(float(text) * 100))
+    return -cents if negative else cents
+
+
+def parse_amounts(texts):
+    """Signed cents for a chunk of amount strings, and a mask of the ones that parsed.
+
+    Plain numbers convert in one numpy pass; chunks with blanks, currency
+    symbols, thousands separators or parentheses fall back to
+    parse_amount per distinct string.
+    """
+    try:
+        values = np.array(texts, dtype=float)
+    except ValueError:
+        parsed = {}
+        for text in set(texts):
+            try:
+                cents = parse_amount(text)
+            except ValueError:
+                cents = None
+            parsed[text] = np.nan if cents is None else cents / 100
+        values = np.fromiter(map(parsed.__getitem__, texts), dtype=float, count=len(texts))
+    ok = np.isfinite(values)
+    return np.rint(np.where(ok, values, 0.0) * 100).astype(np.int64), ok
+
+
+def parse_date(text):
+    """Date string in any of DATE_FORMATS (or an OFX timestamp) -> days since 1970-01-01"""
+    text = text.strip()
+    if len(text) > 8 and text[:8].isdigit():
+        text = text[:8]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date().toordinal() - EPOCH_ORDINAL
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {text!r}")
+
+
+class TransactionStore:
+    """Append-only columnar transaction store in a directory"""
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.lock = FileLock(os.path.join(directory, 'store.lock'))
+        self._writing = False
+        self._load_meta()
+
+    def _load_meta(self):
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+        self.rows = meta.get('rows', 0)
+        self.merchants = meta.get('merchants', [])
+        self.accounts = meta.get('accounts', [])
+        self._merchant_ids = {name: i for i, name in enumerate(self.merchants)}
+        self._account_ids = {name: i for i, name in enumerate(self.accounts)}
+        self._index = None
+        self._pending = 0
+
+    @contextmanager
+    def writing(self):
+        """Hold the store's write lock; append() and commit() are only allowed inside.
+
+        Catches up on rows other writers committed and drops rows an
+        interrupted import appended after the last commit.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self._load_meta()
+            for name, dtype in COLUMNS.items():
+                path = self._column_path(name)
+                if os.path.exists(path) and os.path.getsize(path) > self.rows * dtype.itemsize:
+                    with open(path, 'r+b') as f:
+                        f.truncate(self.rows * dtype.itemsize)
+            self._writing = True
+            try:
+                yield self
+            finally:
+                self._writing = False
+                self._pending = 0
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """Read-only memory map of a committed column"""
+        dtype = COLUMNS[name]
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def transactions(self, first_day=None, last_day=None, account=None):
+        """Dict of column arrays, optionally filtered by day range (inclusive) and account name"""
+        columns = {name: self.column(name) for name in COLUMNS}
+        keep = np.ones(self.rows, dtype=bool)
+        if first_day is not None:
+            keep &= columns['day'] >= first_day
+        if last_day is not None:
+            keep &= columns['day'] <= last_day
+        if account is not None:
+            keep &= columns['account'] == self._account_ids.get(account, -1)
+        if keep.all():
+            return columns
+        return {name: np.asarray(values[keep]) for name, values in columns.items()}
+
+    def merchant_id(self, merchant):
+        merchant_id = self._merchant_ids.get(merchant)
+        if merchant_id is None:
+            merchant_id = self._merchant_ids[merchant] = len(self.merchants)
+            self.merchants.append(merchant)
+        return merchant_id
+
+    def account_id(self, account):
+        account_id = self._account_ids.get(account)
+        if account_id is None:
+            account_id = self._account_ids[account] = len(self.accounts)
+            self.accounts.append(account)
+        return account_id
+
+    def key_index(self):
+        """Sorted array of every stored transaction key, loaded on first use"""
+        if self._index is None:
+            self._index = np.sort(self.column('key'))
+        return self._index
+
+    def append(self, chunk):
+        """Append a chunk of new rows (dict of column arrays); visible after commit()"""
+        if not self._writing:
+            raise RuntimeError("TransactionStore.append() outside writing()")
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(name), 'ab') as f:
+                f.write(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes())
+        index = self.key_index()
+        new_keys = np.sort(chunk['key'])
+        self._index = np.insert(index, np.searchsorted(index, new_keys), new_keys)
+        self._pending += len(chunk['key'])
+
+    def commit(self):
+        """Make appended rows and new dictionary entries durable"""
+        if not self._writing:
+            raise RuntimeError("TransactionStore.commit() outside writing()")
+        for name in COLUMNS:
+            path = self._column_path(name)
+            if os.path.exists(path):
+                with open(path, 'rb+') as f:
+                    os.fsync(f.fileno())
+        self.rows += self._pending
+        self._pending = 0
+        atomic_write_json(self.meta_path, {
+            'rows': self.rows,
+            'columns': {name: dtype.str for name, dtype in COLUMNS.items()},
+            'merchants': self.merchants,
+            'accounts': self.accounts,
+        })
+
+
+def _csv_chunks(f, chunk_rows):
+    """Yield column-list chunks of a bank CSV export"""
+    reader = csv.reader(f)
+    header = [name.strip().lower() for name in next(reader, [])]
+
+    def find(names):
+        for i, name in enumerate(header):
+            if name in names:
+                return i
+        return None
+
+    date_col, description_col = find(DATE_HEADERS), find(DESCRIPTION_HEADERS)
+    amount_col = find(AMOUNT_HEADERS)
+    debit_col, credit_col = find(DEBIT_HEADERS), find(CREDIT_HEADERS)
+    if date_col is None or description_col is None or (amount_col is None and debit_col is None):
+        raise ValueError(f"Unrecognised CSV header: {header}")
+    used = [col for col in (date_col, description_col, amount_col, debit_col, credit_col) if col is not None]
+    width = max(used) + 1
+
+    while True:
+        rows = list(itertools.islice(reader, chunk_rows))
+        if not rows:
+            return
+        read = len(rows)
+        rows = [row for row in rows if len(row) >= width]
+        chunk = {
+            'read': read,
+            'date': [row[date_col] for row in rows],
+            'description': [row[description_col] for row in rows],
+        }
+        if amount_col is not None:
+            chunk['amount'] = [row[amount_col] for row in rows]
+        else:
+            chunk['debit'] = [row[debit_col] for row in rows]
+            chunk['credit'] = [row[credit_col] for row in rows] if credit_col is not None else None
+        yield chunk
+
+
+def _ofx_chunks(f, chunk_rows, info):
+    """Yield column-list chunks of an OFX/QFX export; sets info['account'] from ACCTID"""
+    chunk = {'date': [], 'amount': [], 'description': [], 'fitid': []}
+    transaction = None
+    for line in f:
+        for tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                transaction = {}
+            elif tag == 'ACCTID' and value.strip():
+                info.setdefault('account', value.strip())
+            elif transaction is not None and value:
+                transaction[tag] = value.strip()
+        if transaction is not None and '</STMTTRN>' in line.upper():
+            chunk['date'].append(transaction.get('DTPOSTED', ''))
+            chunk['amount'].append(transaction.get('TRNAMT', ''))
+            chunk['description'].append(transaction.get('NAME') or transaction.get('MEMO', ''))
+            chunk['fitid'].append(transaction.get('FITID', ''))
+            transaction = None
+            if len(chunk['date']) >= chunk_rows:
+                yield dict(chunk, read=len(chunk['date']))
+                chunk = {'date': [], 'amount': [], 'description': [], 'fitid': []}
+    if chunk['date']:
+        yield dict(chunk, read=len(chunk['date']))
+
+
+def _chunk_amounts(chunk):
+    if 'amount' in chunk:
+        return parse_amounts(chunk['amount'])
+    # Separate debit/credit columns: debits are outflows whatever their sign
+    debit, debit_ok = parse_amounts(chunk['debit'])
+    if chunk['credit'] is None:
+        return -np.abs(debit), debit_ok
+    credit, credit_ok = parse_amounts(chunk['credit'])
+    return credit - np.abs(debit), debit_ok | credit_ok
+
+
+def _memo_map(texts, memo, convert):
+    """Apply convert once per distinct string (memoized across chunks); returns (values, ok)"""
+    if len(memo) > MEMO_LIMIT:
+        memo.clear()
+    values = [memo.get(text) for text in texts]
+    if None in values:
+        for i, value in enumerate(values):
+            if value is None:
+                text = texts[i]
+                value = memo.get(text)
+                if value is None:
+                    try:
+                        value = convert(text)
+                    except ValueError:
+                        value = _INVALID
+                    memo[text] = value
+                values[i] = value
+    if _INVALID not in values:
+        return np.array(values, dtype=np.int64), np.ones(len(values), dtype=bool)
+    ok = np.fromiter((value is not _INVALID for value in values), dtype=bool, count=len(values))
+    values = [value if value is not _INVALID else 0 for value in values]
+    return np.array(values, dtype=np.int64), ok
+
+
+def _fitid_keys(fitids):
+    """uint64 hash per FITID; 0 marks a missing one"""
+    keys = np.zeros(len(fitids), dtype=np.uint64)
+    for i, fitid in enumerate(fitids):
+        if fitid:
+            keys[i] = int.from_bytes(hashlib.blake2b(fitid.encode(), digest_size=8).digest(), 'little') or 1
+    return keys
+
+
+class _FileState:
+    """Per-file ordinal counters of identical rows, kept as sorted arrays"""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def ordinals(self, base):
+        """Occurrence number of each row among earlier rows with the same base key"""
+        order = np.argsort(base, kind='stable')
+        sorted_base = base[order]
+        first = np.ones(len(base), dtype=bool)
+        first[1:] = sorted_base[1:] != sorted_base[:-1]
+        positions = np.arange(len(base))
+        rank = np.empty(len(base), dtype=np.int64)
+        rank[order] = positions - np.maximum.accumulate(np.where(first, positions, 0))
+
+        # Searching with sorted needles keeps the lookups cache-friendly
+        pos = np.searchsorted(self.keys, sorted_base)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == sorted_base[found]
+        prior = np.zeros(len(base), dtype=np.int64)
+        prior[order[found]] = self.counts[pos[found]]
+
+        unique, counts = np.unique(sorted_base, return_counts=True)
+        at = np.searchsorted(self.keys, unique)
+        known = at < len(self.keys)
+        known[known] = self.keys[at[known]] == unique[known]
+        self.counts[at[known]] += counts[known]
+        self.keys = np.insert(self.keys, at[~known], unique[~known])
+        self.counts = np.insert(self.counts, at[~known], counts[~known])
+        return prior + rank
+
+
+def _flush(store, state, days, cents, merchants, fitids, account_id, stats):
+    accounts = np.full(len(days), account_id, dtype=np.int64)
+    base = _combine(accounts, days, cents, merchants)
+    keys = _combine(base.view(np.int64), state.ordinals(base))
+    has_fitid = fitids != 0
+    keys[has_fitid] = _combine(accounts[has_fitid], fitids[has_fitid].view(np.int64))
+
+    index = store.key_index()
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    pos = np.searchsorted(index, sorted_keys)
+    found = pos < len(index)
+    found[found] = index[pos[found]] == sorted_keys[found]
+    seen = np.zeros(len(keys), dtype=bool)
+    seen[order] = found
+    new = ~seen
+    stats['duplicates'] += int(seen.sum())
+    stats['added'] += int(new.sum())
+    if new.any():
+        store.append({
+            'day': days[new], 'amount_cents': cents[new], 'merchant': merchants[new],
+            'account': accounts[new], 'key': keys[new]
+        })
+
+
+def import_file(store, source, account=None, chunk_rows=CHUNK_ROWS, name=None):
+    """Import one CSV or OFX export (path or text file object); returns counts.
+
+    account defaults to the OFX ACCTID or the file name. Rows whose date
+    or amount fail to parse are counted as skipped.
+    """
+    name = name or (source if isinstance(source, str) else getattr(source, 'name', 'upload'))
+    stats = {'file': name, 'read': 0, 'added': 0, 'duplicates': 0, 'skipped': 0}
+    info = {}
+    with store.writing():
+        f = open(source, 'r', newline='', encoding='utf-8-sig') if isinstance(source, str) else source
+        try:
+            if name.lower().endswith(('.ofx', '.qfx')):
+                chunks = _ofx_chunks(f, chunk_rows, info)
+            else:
+                chunks = _csv_chunks(f, chunk_rows)
+            state = _FileState()
+            date_memo, merchant_memo = {}, {}
+            account_id = None
+            for chunk in chunks:
+                stats['read'] += chunk['read']
+                days, day_ok = _memo_map(chunk['date'], date_memo, parse_date)
+                cents, amount_ok = _chunk_amounts(chunk)
+                merchants, _ = _memo_map(chunk['description'], merchant_memo,
+                                         lambda text: store.merchant_id(normalize_merchant(text)))
+                fitids = _fitid_keys(chunk['fitid']) if 'fitid' in chunk else np.zeros(len(days), dtype=np.uint64)
+                ok = day_ok & amount_ok
+                stats['skipped'] += chunk['read'] - int(ok.sum())
+                if account_id is None:
+                    account_id = store.account_id(account or info.get('account') or _stem(name))
+                _flush(store, state, days[ok], cents[ok], merchants[ok], fitids[ok], account_id, stats)
+        finally:
+            if isinstance(source, str):
+                f.close()
+        store.commit()
+    return stats
+
+
+def _stem(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def import_upload(store, data, name, account=None):
+    """Import an uploaded export given as bytes"""
+    text = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+    return import_file(store, text, account=account, name=name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import bank CSV/OFX exports into the transaction store")
+    parser.add_argument('files', nargs='+', help="CSV, OFX or QFX exports")
+    parser.add_argument('--store', default=STORE_DIR, help="store directory (default: transactions)")
+    parser.add_argument('--account', help="account name (default: OFX account id or file name)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    store = TransactionStore(args.store)
+    started = time.perf_counter()
+    for path in args.files:
+        stats = import_file(store, path, args.account, args.chunk_rows)
+        print(f"{path}: {stats['read']} read, {stats['added']} added, "
+              f"{stats['duplicates']} duplicates, {stats['skipped']} skipped", file=sys.stderr)
+    print(f"{len(store)} transactions, {len(store.merchants)} merchants in {args.store} "
+          f"({time.perf_counter() - started:.2f}s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())